@@ -4,18 +4,39 @@ Auth generates an account from input and allows them to access flock.
 '''
 
 import re
-import hashlib
+import time
+import heapq
 import jwt
-import smtplib
-from email.mime.text import MIMEText
 import error
+import outbox
+import hashing
 import secrets
-import helper_functions
 
-# [{u_id, email, name_first, name_last, handle_str}]
-registered_users = []
-registered_tokens = []
-reset_codes = [] 
+# {u_id: {u_id, email, name_first, name_last, handle_str}}
+registered_users = {}
+# {email: user}
+registered_emails = {}
+# {handle: user}
+registered_handles = {}
+# {base handle: next suffix to try}
+handle_counters = {}
+# {token: u_id}
+registered_tokens = {}
+# {u_id: set of tokens}
+user_tokens = {}
+# {jti: exp} of logged out tokens
+revoked_tokens = {}
+# [(exp, iat, jti)] min-heap of revoked_tokens, so they are dropped as they expire
+revoked_expiry = []
+# Tokens issued at or before 'iat' are rejected, set when a revocation that
+# hasn't expired is dropped to make room
+revoked_floor = {'iat': 0}
+# {reset_code: email}
+reset_codes = {}
+# {email: reset_code}
+reset_codes_by_email = {}
+# [(expires, reset_code)] min-heap of codes to sweep when they expire
+reset_code_expiry = []
 
 # for validating an Email
 REGEX = r'^[a-z0-9]+[\._]?[a-z0-9]+[@]\w+[.]\w{2,3}$'
@@ -23,6 +44,19 @@ REGEX = r'^[a-z0-9]+[\._]?[a-z0-9]+[@]\w+[.]\w{2,3}$'
 #Secret for jwt
 SECRET = 'Grape1'
 
+#'registry' looks tokens up in registered_tokens, 'jwt' checks the signature
+#and reads u_id from the token so processes don't need to share sessions
+TOKEN_VALIDATION = 'registry'
+
+#Seconds a token stays valid for
+TOKEN_LIFETIME = 24 * 60 * 60
+
+#Most logged out tokens remembered at once
+MAX_REVOKED_TOKENS = 100000
+
+#Seconds a reset code stays valid for
+RESET_CODE_LIFETIME = 15 * 60
+
 
 def auth_login(email, password):
     '''
@@ -33,43 +67,49 @@ def auth_login(email, password):
         raise error.InputError(description="Email Invalid")
 
     #Email does not belong to a user
-    user_not_found = True
-    for user in registered_users:
-        if user.get('email') == email:
-            u_id = user.get("u_id")
-            user_not_found = False
-            break
-
-    if user_not_found:
+    user = registered_emails.get(email)
+    if user is None:
         raise error.InputError(description="Email not registered")
 
-    #Incorrect password booleon
-    incorrect_password = True
+    u_id = user.get("u_id")
 
     #Check if encrypted passwords are the same
-    encrypted_password = hashlib.sha256(password.encode()).hexdigest()
-    for user in registered_users:
-        if user.get('email') == email:
-            if user.get('password') == encrypted_password:
-                incorrect_password = False
-
-    if incorrect_password:
+    if not hashing.verify_password(password, user.get('password')):
         raise error.InputError(description="Password is invalid")
 
-   
-    #Token will be hashed u_id
-    token = str(jwt.encode({'u_id' : u_id}, SECRET, algorithm='HS256'))
+    #Upgrade hashes made with an older algorithm now we have the password
+    if hashing.needs_rehash(user.get('password')):
+        user['password'] = hashing.upgrade_password(password)
+
+    #See if user is already logged in
+    if u_id in user_tokens:
+        raise error.InputError(description="User already logged in")
+
+    return create_session(u_id)
+
+
+def create_session(u_id):
+    '''
+        Issues a token for u_id and adds it to the session registry
+    '''
+    #Token will be signed u_id with a unique id, issue time and expiry
+    now = time.time()
+    payload = {
+        'u_id': u_id,
+        'jti': secrets.token_hex(8),
+        'iat': now,
+        'exp': int(now) + TOKEN_LIFETIME,
+    }
+    token = jwt.encode(payload, SECRET, algorithm='HS256')
+    if isinstance(token, bytes):
+        token = token.decode()
 
     verification = {'u_id': u_id,
                     'token': token,
                     }
 
-    #See if user is already logged in
-    if helper_functions.check_token(token).get('token_status') == False:
-        raise error.InputError(description="User already logged in")
-
-    #Append to registered_tokens
-    registered_tokens.append(verification)
+    #Add to the session registry
+    session_add(token, u_id)
     return verification
 
 
@@ -77,14 +117,10 @@ def auth_logout(token):
     '''
         Removes the data from input from logged in data
     '''
-    #Remove the user from registered_token
-    invalid_token = True
-    for user in registered_tokens:
-        if user.get('token') == token:
-            registered_tokens.remove(user)
-            invalid_token = False
-
-    if invalid_token:
+    #Remove the user from registered_token and revoke the token
+    removed = session_remove(token)
+    revoked = revoke_token(token)
+    if not (removed or revoked):
         return {
             'is_success': False,
         }
@@ -94,18 +130,136 @@ def auth_logout(token):
     }
 
 
-def auth_register(email, password, name_first, name_last):
+def session_add(token, u_id):
     '''
-        Generates new data in the form of dictionary for input
+        Adds a token to the session registry
+    '''
+    registered_tokens[token] = u_id
+    user_tokens.setdefault(u_id, set()).add(token)
+
+
+def session_remove(token):
     '''
+        Removes a token from the session registry, returns False if not found
+    '''
+    u_id = registered_tokens.pop(token, None)
+    if u_id is None:
+        return False
+
+    tokens = user_tokens.get(u_id)
+    if tokens is not None:
+        tokens.discard(token)
+        if not tokens:
+            del user_tokens[u_id]
+
+    return True
+
+
+def add_user(user):
+    '''
+        Adds a user to the user table and its email and handle indexes
+    '''
+    registered_users[user['u_id']] = user
+    registered_emails[user['email']] = user
+    reserve_handle(user['handle'], user)
+
+
+def allocate_handle(name_first, name_last):
+    '''
+        Returns an unused handle of at most 20 characters for the given name
+    '''
+    base = name_first.lower() + name_last.lower()
+    base = base[:20]
+
+    #If taken replace the end of the handle with the next suffix for this base
+    handle = base
+    while handle in registered_handles:
+        suffix = str(handle_counters.get(base, 0))
+        handle_counters[base] = int(suffix) + 1
+        handle = base[:20 - len(suffix)] + suffix
 
+    return handle
+
+
+def reserve_handle(handle, user):
+    '''
+        Claims a handle for a user, raises InputError if it is taken
+    '''
+    if handle in registered_handles:
+        raise error.InputError(description="Handle_str being used")
+
+    registered_handles[handle] = user
+
+
+def release_handle(handle):
+    '''
+        Frees a handle so it can be claimed again
+    '''
+    registered_handles.pop(handle, None)
+
+
+def decode_token(token):
+    '''
+        Returns the u_id signed into a token, or None if it is invalid,
+        expired or revoked
+    '''
+    try:
+        payload = jwt.decode(token, SECRET, algorithms=['HS256'])
+    except jwt.ExpiredSignatureError:
+        return None
+    except jwt.InvalidTokenError:
+        #Tokens not issued by auth_login, e.g. the hangman bot
+        return registered_tokens.get(token)
+
+    if payload.get('jti') in revoked_tokens:
+        return None
+
+    #Its revocation may have been dropped to make room
+    if payload.get('iat', 0) <= revoked_floor['iat']:
+        return None
+
+    return payload.get('u_id')
+
+
+def revoke_token(token):
+    '''
+        Adds a signed token to revoked_tokens, returns False if it is
+        invalid or already revoked
+    '''
+    try:
+        payload = jwt.decode(token, SECRET, algorithms=['HS256'])
+    except jwt.InvalidTokenError:
+        return False
+
+    jti = payload.get('jti')
+    if jti is None or jti in revoked_tokens:
+        return False
+
+    #Expired tokens are rejected anyway, so their revocations can go
+    now = time.time()
+    while revoked_expiry and revoked_expiry[0][0] <= now:
+        _, _, expired = heapq.heappop(revoked_expiry)
+        del revoked_tokens[expired]
+
+    #Still full, so drop the revocation that expires first and reject
+    #every token issued up to it rather than letting it back in
+    if len(revoked_tokens) >= MAX_REVOKED_TOKENS:
+        _, iat, dropped = heapq.heappop(revoked_expiry)
+        del revoked_tokens[dropped]
+        revoked_floor['iat'] = max(revoked_floor['iat'], iat)
+
+    revoked_tokens[jti] = payload.get('exp')
+    heapq.heappush(revoked_expiry, (payload.get('exp'), payload.get('iat', 0), jti))
+    return True
+
+
+def check_registration(email, password, name_first, name_last):
+    '''
+        Raises InputError if the details can't be used to register
+    '''
     #Check if email is already taken
-    if len(registered_users) == 0:
-        pass
-    else:
-        for data in registered_users:
-            if data.get("email") == email:
-                raise error.InputError(description="Email is already taken")
+    if email in registered_emails:
+        raise error.InputError(description="Email is already taken")
 
     #If password is less then length 6
     if len(password) < 6:
@@ -123,22 +277,17 @@ def auth_register(email, password, name_first, name_last):
     if (len(name_last) < 1) or (len(name_last) > 50):
         raise error.InputError(description="Last name less than 1 or greater than 50 characters")
 
-    #Generate a handle
-    handle = name_first.lower() + name_last.lower()
-    handle = handle[:20]
 
-    #Check if handle is taken
-    for user in registered_users:
-        #If taken get rid of last character of handle name
-        if user.get('handle') == handle:
-            handle = handle[:-1]
+def create_user(email, encrypted_password, name_first, name_last):
+    '''
+        Adds a user with a new u_id and handle, returns the user
+    '''
+    #Generate a handle
+    handle = allocate_handle(name_first, name_last)
 
-    #Generate u_id. For now its the index of the dictionary in the list
+    #Generate u_id. For now its the number of users in the table
     u_id = len(registered_users)
 
-    #Encrypt password
-    encrypted_password = hashlib.sha256(password.encode()).hexdigest()
-
     #if new_user is the very first registration, make flocker owner
     permissions = 2
     if u_id == 0:
@@ -154,77 +303,95 @@ def auth_register(email, password, name_first, name_last):
         'permissions': permissions,
         'profile_img_url': None
     }
-    
 
-    registered_users.append(new_user)
+    add_user(new_user)
+    return new_user
+
+
+def auth_register(email, password, name_first, name_last):
+    '''
+        Generates new data in the form of dictionary for input
+    '''
+    check_registration(email, password, name_first, name_last)
+
+    #Encrypt password
+    encrypted_password = hashing.hash_password(password)
+
+    create_user(email, encrypted_password, name_first, name_last)
 
     #Log the user in using auth_login
     return auth_login(email, password)
 
-def auth_passwordreset_request(email):
 
-    # check if user is registered (existing email)
-    user_not_found = True
-    for user in registered_users:
-        if user.get('email') == email:
-            user_not_found = False
-            break
+def auth_register_bulk(users):
+    '''
+        Registers a list of {email, password, name_first, name_last, login}
+        in one pass, returns a result for each row in the same order
+    '''
+    results = [None] * len(users)
+
+    #Validate every row, including emails repeated within the batch
+    valid_rows = []
+    batch_emails = set()
+    for index, row in enumerate(users):
+        email = row.get('email', '')
+        try:
+            check_registration(email, row.get('password', ''),
+                               row.get('name_first', ''), row.get('name_last', ''))
+            if email in batch_emails:
+                raise error.InputError(description="Email is already taken")
+        except error.InputError as err:
+            results[index] = {'error': err.description}
+            continue
 
-    if user_not_found:
-        raise error.InputError(description="Email not registered")
+        batch_emails.add(email)
+        valid_rows.append((index, row))
 
-    # generate a reset code using secrets module (10 characters unique code)
-    reset_code = secrets.token_hex(5)
+    #Encrypt all passwords at once across the hashing pool
+    encrypted_passwords = hashing.hash_passwords([row['password'] for _, row in valid_rows])
 
-    user_reset = {
-        'email': email,
-        'reset_code': reset_code
-    }
+    #Add users, logging in only those that asked for it
+    for (index, row), encrypted_password in zip(valid_rows, encrypted_passwords):
+        new_user = create_user(row['email'], encrypted_password, row['name_first'], row['name_last'])
+        if row.get('login', False):
+            results[index] = create_session(new_user['u_id'])
+        else:
+            results[index] = {'u_id': new_user['u_id']}
 
-    reset_code_new = {'reset_code': reset_code}
+    return {'results': results}
 
-    # check if user has already requested and if yes, then update
-    user_already_requested = False
-    for user in reset_codes:
-        if user.get('email') == email:
-            user.update(reset_code_new)
-            user_already_requested = True
-            break 
+def auth_passwordreset_request(email):
+
+    # check if user is registered (existing email)
+    if email not in registered_emails:
+        raise error.InputError(description="Email not registered")
 
-    # append reset_code to list so can check later 
-    if user_already_requested == False:
-        reset_codes.append(user_reset)
+    # generate a reset code using secrets module (10 characters unique code)
+    reset_code = secrets.token_hex(5)
 
-    # send email 
-    sender = 'fridaygrape1@gmail.com'
-    receiver = [email]
+    # check if user has already requested and if yes, then replace that code
+    sweep_reset_codes()
+    old_code = reset_codes_by_email.get(email)
+    if old_code is not None:
+        del reset_codes[old_code]
 
-    msg = MIMEText(reset_code)
-    msg['Subject'] = 'Reset Code'
-    msg['From'] = 'fridaygrape1@gmail.com'
-    msg['To'] = email
+    # store reset_code so can check later, it expires after RESET_CODE_LIFETIME
+    reset_codes[reset_code] = email
+    reset_codes_by_email[email] = reset_code
+    heapq.heappush(reset_code_expiry, (time.time() + RESET_CODE_LIFETIME, reset_code))
 
-    server = smtplib.SMTP_SSL('smtp.gmail.com', 465)
-    server.login("fridaygrape1@gmail.com", "comp1531")
-    server.sendmail(sender, receiver, msg.as_string())
-    server.quit()
+    # queue the email, the outbox sends it in the background
+    outbox.send_email(email, 'Reset Code', reset_code)
 
     return {}
 
 def auth_passwordreset_reset(reset_code, new_password):
-    # checking validity of reset code 
-    invalid_code = True
-    for user in reset_codes:
-        # check if the code given is an existing code
-        if reset_code == user.get("reset_code"):
-            # grab email of user
-            email = user.get("email")
-            # if reset code is valid, then break out of loop
-            invalid_code = False
-            break
-
-    # Raise an input error if invalid_token is true
-    if invalid_code == True:
+    # checking validity of reset code, grab email of user if it exists
+    sweep_reset_codes()
+    email = reset_codes.get(reset_code)
+
+    # Raise an input error if the code is invalid or expired
+    if email is None or email not in registered_emails:
         raise error.InputError("You have entered an invalid reset code")
 
     # checking validity of password, if password is less then length 6
@@ -232,15 +399,28 @@ def auth_passwordreset_reset(reset_code, new_password):
         raise error.InputError(description="Password length less than 6")
 
     #Encrypt password
-    encrypted_password = hashlib.sha256(new_password.encode()).hexdigest()
+    encrypted_password = hashing.hash_password(new_password)
 
     # updating password 
     password_new = {'password': encrypted_password}
 
-    for users in registered_users:
-        if users['email'] == email:
-            # gets rid of existing value and replaces it with new value
-            users.update(password_new)
-            break
+    # gets rid of existing value and replaces it with new value
+    registered_emails[email].update(password_new)
+
+    # reset codes can only be used once
+    del reset_codes[reset_code]
+    del reset_codes_by_email[email]
 
     return {}
+
+def sweep_reset_codes():
+    '''
+        Removes reset codes that have expired
+    '''
+    now = time.time()
+    while reset_code_expiry and reset_code_expiry[0][0] <= now:
+        _, reset_code = heapq.heappop(reset_code_expiry)
+        # codes that were replaced or used are already gone
+        email = reset_codes.pop(reset_code, None)
+        if email is not None:
+            del reset_codes_by_email[email]
@@ -0,0 +1,152 @@
+'''
+Benchmarks auth_register, auth_login, auth_logout and check_token as the
+number of registered users grows, both in-process and through server.py.
+
+    python3 auth_benchmark.py --sizes 1000 10000 100000 1000000
+'''
+import argparse
+import time
+import json
+import auth
+import hashing
+import helper_functions
+import server
+from other import clear
+
+PASSWORD = 'benchpassword'
+
+
+def fill_users(count):
+    '''
+    Reset the data and add count synthetic users straight into the user table.
+    '''
+    clear()
+    # Every synthetic user shares one hash so filling doesn't run the KDF
+    encrypted_password = hashing.hash_password(PASSWORD)
+    for u_id in range(count):
+        auth.add_user({
+            'email': f'bench{u_id}@gmail.com',
+            'password': encrypted_password,
+            'first_name': 'Bench',
+            'last_name': f'User{u_id}',
+            'handle': f'bench{u_id}',
+            'u_id': u_id,
+            'permissions': 1 if u_id == 0 else 2,
+            'profile_img_url': None,
+        })
+
+
+def time_calls(calls):
+    '''
+    Run each call, returns the latency of each in seconds.
+    '''
+    latencies = []
+    for call in calls:
+        start = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def summarise(latencies):
+    '''
+    Returns ops/sec, p50 and p99 in microseconds for a list of latencies.
+    '''
+    ordered = sorted(latencies)
+    total = sum(ordered)
+    return {
+        'ops_per_sec': len(ordered) / total if total else 0,
+        'p50_us': ordered[len(ordered) // 2] * 1e6,
+        'p99_us': ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1e6,
+    }
+
+
+def bench_in_process(size, ops):
+    '''
+    Time each auth function called directly with size users registered.
+    '''
+    results = {}
+    fill_users(size)
+
+    emails = [f'bench{u_id}@gmail.com' for u_id in range(min(ops, size))]
+    results['auth_login'] = time_calls(
+        [lambda email=email: auth.auth_login(email, PASSWORD) for email in emails])
+
+    tokens = list(auth.registered_tokens)
+    results['check_token'] = time_calls(
+        [lambda token=token: helper_functions.check_token(token) for token in tokens])
+
+    results['auth_logout'] = time_calls(
+        [lambda token=token: auth.auth_logout(token) for token in tokens])
+
+    results['auth_register'] = time_calls(
+        [lambda i=i: auth.auth_register(f'new{i}@gmail.com', PASSWORD, 'New', 'User')
+         for i in range(ops)])
+    return results
+
+
+def bench_server(size, ops):
+    '''
+    Time the matching server.py endpoints with size users registered.
+    '''
+    results = {}
+    fill_users(size)
+    client = server.APP.test_client()
+
+    emails = [f'bench{u_id}@gmail.com' for u_id in range(min(ops, size))]
+    tokens = []
+
+    def login(email):
+        response = client.post('/auth/login', json={'email': email, 'password': PASSWORD})
+        tokens.append(json.loads(response.data)['token'])
+
+    results['auth_login'] = time_calls([lambda email=email: login(email) for email in emails])
+
+    # Profile lookups are the cheapest endpoint that checks a token
+    results['check_token'] = time_calls(
+        [lambda token=token: client.get('/user/profile', query_string={'token': token, 'u_id': 0})
+         for token in tokens])
+
+    results['auth_logout'] = time_calls(
+        [lambda token=token: client.post('/auth/logout', json={'token': token}) for token in tokens])
+
+    results['auth_register'] = time_calls(
+        [lambda i=i: client.post('/auth/register', json={
+            'email': f'new{i}@gmail.com', 'password': PASSWORD,
+            'name_first': 'New', 'name_last': 'User'}) for i in range(ops)])
+    return results
+
+
+def run_benchmark(sizes, ops):
+    '''
+    Returns [{mode, size, function, ops_per_sec, p50_us, p99_us}] for every size.
+    '''
+    rows = []
+    for size in sizes:
+        for mode, bench in (('in-process', bench_in_process), ('server', bench_server)):
+            for function, latencies in bench(size, ops).items():
+                row = {'mode': mode, 'size': size, 'function': function}
+                row.update(summarise(latencies))
+                rows.append(row)
+    clear()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 1000000])
+    parser.add_argument('--ops', type=int, default=1000, help='calls timed per function and size')
+    parser.add_argument('--algorithm', default='sha256',
+                        help='password hashing algorithm, sha256 keeps the KDF out of the numbers')
+    args = parser.parse_args()
+
+    hashing.ALGORITHM = args.algorithm
+
+    print(f"{'mode':<12}{'users':>10}  {'function':<15}{'ops/sec':>12}{'p50 us':>12}{'p99 us':>12}")
+    for row in run_benchmark(args.sizes, args.ops):
+        print(f"{row['mode']:<12}{row['size']:>10}  {row['function']:<15}"
+              f"{row['ops_per_sec']:>12.0f}{row['p50_us']:>12.1f}{row['p99_us']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+'''
+Imported files for auth_benchmark_test.
+'''
+import auth
+import auth_benchmark
+
+def test_fill_users():
+    '''
+    Testing that synthetic users are indexed and can log in.
+    '''
+    auth_benchmark.fill_users(10)
+    assert len(auth.registered_users) == 10
+    assert auth.auth_login("bench9@gmail.com", auth_benchmark.PASSWORD).get('u_id') == 9
+
+def test_run_benchmark():
+    '''
+    Testing that every function is reported for both modes and each size.
+    '''
+    rows = auth_benchmark.run_benchmark([5, 10], 3)
+    assert len(rows) == 2 * 2 * 4
+    assert {row['function'] for row in rows} == {'auth_register', 'auth_login', 'auth_logout', 'check_token'}
+    assert all(row['ops_per_sec'] > 0 and row['p99_us'] >= row['p50_us'] for row in rows)
+    assert auth.registered_users == {}
@@ -71,6 +71,26 @@ def test_register_valid(url):
     assert payload2['user']['u_id'] == payload['u_id']
     assert payload2['user']['email'] == "abc@gmail.com"
 
+def test_register_bulk(url):
+    '''
+    Testing if auth_register_bulk works on server.
+    '''
+    requests.delete(f"{url}/clear")
+
+    bulk_return = requests.post(f"{url}/auth/register/bulk", json={'users': [
+        {'email': 'abc@gmail.com', 'password': 'password', 'name_first': 'abc', 'name_last': 'def', 'login': True},
+        {'email': 'abc', 'password': 'password', 'name_first': 'abc', 'name_last': 'def'},
+        {'email': 'ghi@gmail.com', 'password': 'password', 'name_first': 'ghi', 'name_last': 'jkl'},
+    ]})
+    results = bulk_return.json()['results']
+
+    assert bulk_return.status_code == 200
+    assert 'error' in results[1]
+    assert results[2] == {'u_id': 1}
+
+    user_server_detail = requests.get(f"{url}/user/profile?token={results[0]['token']}&u_id=1")
+    assert user_server_detail.json()['user']['email'] == "ghi@gmail.com"
+
 def test_register_invalid_email(url):
     '''
     Testing when email is invalid.
@@ -2,11 +2,13 @@
 '''
 Imported files for auth_test.
 '''
+import time
 import pytest 
 import error 
 import auth
 from other import clear
 from user import user_profile
+from helper_functions import check_token
 
 
 #################################################################################
@@ -107,6 +109,114 @@ def test_invalid_logout_with_registered_user():
     auth.auth_register("test@gmail.com", "password", "Firstname", "Lastname")
     assert auth.auth_logout('invalid_token').get('is_success') == False
 
+def test_logout_cleans_user_tokens():
+    '''
+    Testing that the u_id is dropped from user_tokens after its last logout.
+    '''
+    clear()
+    current_user = auth.auth_register("test6@gmail.com", "password", "Firstname", "Lastname")
+    u_id = current_user.get('u_id')
+    assert auth.user_tokens[u_id] == {current_user.get('token')}
+
+    auth.auth_logout(current_user.get('token'))
+    assert current_user.get('token') not in auth.registered_tokens
+    assert u_id not in auth.user_tokens
+
+def test_session_remove_unknown_token():
+    '''
+    Testing that session_remove returns False for a token that is not registered.
+    '''
+    clear()
+    assert auth.session_remove('invalid_token_not_exist') == False
+
+def test_clear_resets_sessions():
+    '''
+    Testing that clear empties both session maps.
+    '''
+    clear()
+    auth.auth_register("test7@gmail.com", "password", "Firstname", "Lastname")
+    clear()
+    assert auth.registered_tokens == {}
+    assert auth.user_tokens == {}
+
+def test_jwt_validation(monkeypatch):
+    '''
+    Testing that jwt mode reads u_id from the signed token without the session registry.
+    '''
+    clear()
+    monkeypatch.setattr(auth, 'TOKEN_VALIDATION', 'jwt')
+    current_user = auth.auth_register("test8@gmail.com", "password", "Firstname", "Lastname")
+    token = current_user.get('token')
+
+    # Another process would not have the token in its registry
+    auth.registered_tokens.clear()
+    assert check_token(token) == {'token_status': False, 'u_id': current_user.get('u_id')}
+
+    forged = token[:-2] + ('AA' if not token.endswith('AA') else 'BB')
+    assert check_token(forged).get('token_status') == True
+
+def test_jwt_logout_revokes(monkeypatch):
+    '''
+    Testing that jwt mode rejects a token after logout.
+    '''
+    clear()
+    monkeypatch.setattr(auth, 'TOKEN_VALIDATION', 'jwt')
+    current_user = auth.auth_register("test9@gmail.com", "password", "Firstname", "Lastname")
+    token = current_user.get('token')
+
+    assert auth.auth_logout(token).get('is_success') == True
+    assert check_token(token).get('token_status') == True
+    assert auth.auth_logout(token).get('is_success') == False
+
+    # Logging back in issues a new token that is not revoked
+    new_user = auth.auth_login("test9@gmail.com", "password")
+    assert new_user.get('token') != token
+    assert check_token(new_user.get('token')).get('token_status') == False
+
+def test_revoked_tokens_bounded(monkeypatch):
+    '''
+    Testing that the revocation set stays bounded without letting dropped tokens back in.
+    '''
+    clear()
+    monkeypatch.setattr(auth, 'TOKEN_VALIDATION', 'jwt')
+    monkeypatch.setattr(auth, 'MAX_REVOKED_TOKENS', 2)
+    tokens = []
+    for counter in range(3):
+        current_user = auth.auth_register(f"test1{counter}@gmail.com", "password", "Firstname", "Lastname")
+        tokens.append(current_user.get('token'))
+        auth.auth_logout(current_user.get('token'))
+
+    assert len(auth.revoked_tokens) == 2
+    for token in tokens:
+        assert check_token(token).get('token_status') == True
+
+    # Tokens issued after the dropped revocation still work
+    new_user = auth.auth_login("test10@gmail.com", "password")
+    assert check_token(new_user.get('token')).get('token_status') == False
+
+def test_expired_revocations_dropped(monkeypatch):
+    '''
+    Testing that revocations are dropped once their tokens expire, whatever order they were made in.
+    '''
+    clear()
+    monkeypatch.setattr(auth, 'TOKEN_VALIDATION', 'jwt')
+    monkeypatch.setattr(auth, 'TOKEN_LIFETIME', 100)
+    long_user = auth.auth_register("test10@gmail.com", "password", "Firstname", "Lastname")
+    monkeypatch.setattr(auth, 'TOKEN_LIFETIME', 1)
+    short_user = auth.auth_register("test11@gmail.com", "password", "Firstname", "Lastname")
+
+    # The long lived token is revoked first, so it is oldest by revocation order
+    auth.auth_logout(long_user.get('token'))
+    auth.auth_logout(short_user.get('token'))
+    assert len(auth.revoked_tokens) == 2
+    time.sleep(2.1)
+
+    other_user = auth.auth_register("test12@gmail.com", "password", "Firstname", "Lastname")
+    auth.auth_logout(other_user.get('token'))
+    assert len(auth.revoked_tokens) == 2
+    assert auth.revoked_floor == {'iat': 0}
+    assert check_token(long_user.get('token')).get('token_status') == True
+
 #################################################################################
 #                                                                               #
 #                      auth_register testing functions                          #
@@ -299,6 +409,92 @@ def test_valid_handle():
 
     assert user_detail.get('user').get('name_last') == "Lastname"
 
+def test_handle_collisions_unique():
+    '''
+    Testing that users with the same name all get unique handles of 20 characters or fewer.
+    '''
+    clear()
+    handles = set()
+    for i in range(30):
+        current_user = auth.auth_register(f"johnsmith{i}@gmail.com", "password", "John", "Smith")
+        user_detail = user_profile(current_user.get("token"), current_user.get("u_id"))
+        handles.add(user_detail.get('user').get('handle_str'))
+
+    assert len(handles) == 30
+    assert "johnsmith" in handles
+    assert all(len(handle) <= 20 for handle in handles)
+
+def test_long_handle_collision():
+    '''
+    Testing that a colliding 20 character handle stays within 20 characters.
+    '''
+    clear()
+    user_1 = auth.auth_register("long1@gmail.com", "password", "Abcdefghijkl", "Mnopqrstuvwx")
+    user_2 = auth.auth_register("long2@gmail.com", "password", "Abcdefghijkl", "Mnopqrstuvwx")
+    handle_1 = user_profile(user_1.get("token"), user_1.get("u_id")).get('user').get('handle_str')
+    handle_2 = user_profile(user_2.get("token"), user_2.get("u_id")).get('user').get('handle_str')
+
+    assert handle_1 == "abcdefghijklmnopqrst"
+    assert handle_2 == "abcdefghijklmnopqrs0"
+
+#################################################################################
+#                                                                               #
+#                      auth_register_bulk testing functions                     #
+#                                                                               #
+#################################################################################
+
+def test_register_bulk_valid():
+    '''
+    Testing that a batch of users is registered with unique u_ids and handles.
+    '''
+    clear()
+    rows = [{'email': f"bulk{i}@gmail.com", 'password': "password",
+             'name_first': "John", 'name_last': "Smith"} for i in range(20)]
+    results = auth.auth_register_bulk(rows).get('results')
+
+    assert [result.get('u_id') for result in results] == list(range(20))
+    assert all('token' not in result for result in results)
+    handles = {user['handle'] for user in auth.registered_users.values()}
+    assert len(handles) == 20
+
+    token = auth.auth_login("bulk3@gmail.com", "password").get('token')
+    assert user_profile(token, 3).get('user').get('email') == "bulk3@gmail.com"
+
+def test_register_bulk_login():
+    '''
+    Testing that only rows asking to log in get a token.
+    '''
+    clear()
+    results = auth.auth_register_bulk([
+        {'email': "bulk1@gmail.com", 'password': "password", 'name_first': "A", 'name_last': "B", 'login': True},
+        {'email': "bulk2@gmail.com", 'password': "password", 'name_first': "C", 'name_last': "D"},
+    ]).get('results')
+
+    assert check_token(results[0].get('token')) == {'token_status': False, 'u_id': 0}
+    assert 'token' not in results[1]
+    assert 1 not in auth.user_tokens
+
+def test_register_bulk_errors():
+    '''
+    Testing that invalid rows get an error without stopping the rest of the batch.
+    '''
+    clear()
+    auth.auth_register("taken@gmail.com", "password", "First", "Last")
+    results = auth.auth_register_bulk([
+        {'email': "taken@gmail.com", 'password': "password", 'name_first': "A", 'name_last': "B"},
+        {'email': "new@gmail.com", 'password': "pass", 'name_first': "A", 'name_last': "B"},
+        {'email': "new@gmail.com", 'password': "password", 'name_first': "A", 'name_last': "B"},
+        {'email': "new@gmail.com", 'password': "password", 'name_first': "A", 'name_last': "B"},
+        {'email': "invalid", 'password': "password", 'name_first': "A", 'name_last': "B"},
+    ]).get('results')
+
+    assert 'error' in results[0]
+    assert 'error' in results[1]
+    assert results[2] == {'u_id': 1}
+    assert 'error' in results[3]
+    assert 'error' in results[4]
+    assert len(auth.registered_users) == 2
+
 #################################################################################
 #                                                                               #
 #                auth_passwordreset_request testing functions                   #
@@ -313,7 +509,7 @@ def test_working_request():
     clear()
     user_1 = auth.auth_register("fridaygrape1@gmail.com", "password", "First", "Last")
     auth.auth_passwordreset_request("fridaygrape1@gmail.com")
-    code = auth.reset_codes[0].get('reset_code')
+    code = auth.reset_codes_by_email["fridaygrape1@gmail.com"]
     auth.auth_passwordreset_reset(code, "newpassword")
     auth.auth_logout(user_1.get("token"))
     auth.auth_login("fridaygrape1@gmail.com", "newpassword")
@@ -335,7 +531,7 @@ def test_invalid_password():
     clear()
     auth.auth_register("fridaygrape1@gmail.com", "password", "First", "Last")
     auth.auth_passwordreset_request("fridaygrape1@gmail.com")
-    code = auth.reset_codes[0].get('reset_code')
+    code = auth.reset_codes_by_email["fridaygrape1@gmail.com"]
     with pytest.raises(error.InputError):
         auth.auth_passwordreset_reset(code, "lol")
 
@@ -343,7 +539,7 @@ def test_working_reset():
     clear()
     user_1 = auth.auth_register("fridaygrape1@gmail.com", "password", "First", "Last")
     auth.auth_passwordreset_request("fridaygrape1@gmail.com")
-    code = auth.reset_codes[0].get('reset_code')
+    code = auth.reset_codes_by_email["fridaygrape1@gmail.com"]
     auth.auth_passwordreset_reset(code, "newpassword")
     auth.auth_logout(user_1.get("token"))
     auth.auth_login("fridaygrape1@gmail.com", "newpassword")
@@ -352,13 +548,13 @@ def test_working_reset_twice():
     clear()
     user_1 = auth.auth_register("fridaygrape1@gmail.com", "password", "First", "Last")
     auth.auth_passwordreset_request("fridaygrape1@gmail.com")
-    code = auth.reset_codes[0].get('reset_code')
+    code = auth.reset_codes_by_email["fridaygrape1@gmail.com"]
     auth.auth_passwordreset_reset(code, "newpassword")
     auth.auth_logout(user_1.get("token"))
-    auth.auth_login("fridaygrape1@gmail.com", "newpassword")
+    user_1 = auth.auth_login("fridaygrape1@gmail.com", "newpassword")
 
     auth.auth_passwordreset_request("fridaygrape1@gmail.com")
-    code = auth.reset_codes[0].get('reset_code')
+    code = auth.reset_codes_by_email["fridaygrape1@gmail.com"]
     auth.auth_passwordreset_reset(code, "newerpassword")
     auth.auth_logout(user_1.get("token"))
     auth.auth_login("fridaygrape1@gmail.com", "newerpassword")
@@ -367,14 +563,45 @@ def test_working_multiple_users():
     clear()
     user_1 = auth.auth_register("fridaygrape1@gmail.com", "password", "First", "Last")
     auth.auth_passwordreset_request("fridaygrape1@gmail.com")
-    code = auth.reset_codes[0].get('reset_code')
+    code = auth.reset_codes_by_email["fridaygrape1@gmail.com"]
     auth.auth_passwordreset_reset(code, "newpassword")
     auth.auth_logout(user_1.get("token"))
     auth.auth_login("fridaygrape1@gmail.com", "newpassword")
 
     user_2 = auth.auth_register("pomeranians37@gmail.com", "password", "First", "Last")
     auth.auth_passwordreset_request("pomeranians37@gmail.com")
-    code = auth.reset_codes[1].get('reset_code')
+    code = auth.reset_codes_by_email["pomeranians37@gmail.com"]
     auth.auth_passwordreset_reset(code, "newpassword")
     auth.auth_logout(user_2.get("token"))
     auth.auth_login("pomeranians37@gmail.com", "newpassword")
+
+def test_reset_code_used_once():
+    clear()
+    auth.auth_register("fridaygrape1@gmail.com", "password", "First", "Last")
+    auth.auth_passwordreset_request("fridaygrape1@gmail.com")
+    code = auth.reset_codes_by_email["fridaygrape1@gmail.com"]
+    auth.auth_passwordreset_reset(code, "newpassword")
+    with pytest.raises(error.InputError):
+        auth.auth_passwordreset_reset(code, "newerpassword")
+
+def test_reset_code_replaced():
+    clear()
+    auth.auth_register("fridaygrape1@gmail.com", "password", "First", "Last")
+    auth.auth_passwordreset_request("fridaygrape1@gmail.com")
+    old_code = auth.reset_codes_by_email["fridaygrape1@gmail.com"]
+    auth.auth_passwordreset_request("fridaygrape1@gmail.com")
+    assert len(auth.reset_codes) == 1
+    with pytest.raises(error.InputError):
+        auth.auth_passwordreset_reset(old_code, "newpassword")
+
+def test_reset_code_expired(monkeypatch):
+    clear()
+    monkeypatch.setattr(auth, 'RESET_CODE_LIFETIME', 0)
+    auth.auth_register("fridaygrape1@gmail.com", "password", "First", "Last")
+    auth.auth_passwordreset_request("fridaygrape1@gmail.com")
+    code = auth.reset_codes_by_email["fridaygrape1@gmail.com"]
+    with pytest.raises(error.InputError):
+        auth.auth_passwordreset_reset(code, "newpassword")
+    assert auth.reset_codes == {}
+    assert auth.reset_codes_by_email == {}
+    assert auth.reset_code_expiry == []
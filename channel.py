@@ -1,38 +1,41 @@
 '''
 Imported files for channel.
 '''
+import itertools
 import auth 
 import channels 
 import error
 import helper_functions
+import message_log
 
 
 ""
 "ONLY ONE DATA STRUCTURE CHANNEL_DATA_BASE"
-"A list consisting of dictionaries"
+"A dictionary keyed by channel_id"
 ""
 
-#channel_data = [ {
-#        'owner_ids': [],
-#        'member_ids': [{
-#          }],
+#channel_data = { channel_id: {
+#        'owner_ids': {u_id: None},
+#        'member_ids': {u_id: None},
 #        'channel_id': channel_id,
 #        'is_public': True,
-#        'messages': [
+#        'messages': message_log of [
 #           'message_sent': message,
 #           'message_id': gen_id,
 #           'user_id': user_id,
 #           'time_created': time_create,
-#           'reacts': [
-#               'react_id: 1 (always 1, never changes)
-#               'u_ids: [],
-#           ],
+#           'reacts': {
+#               react_id (1 is always there): {
+#                   'u_ids': {u_id: None} in the order they reacted,
+#                   'listing': [u_ids] or None until next shown,
+#               },
+#           },
 #           'is_pinned': False (True when pinned),
 #         ]
 #    }
 #        'name': name_of_channel
 #    }
-#    ]
+#    }
 
 
 #For this we need to append u_id to channel_data_base { 'member_id = []}
@@ -49,10 +52,11 @@ def channel_invite(token, channel_id, u_id):
         raise error.InputError("User not valid")
 
     # user token is invalid 
-    if helper_functions.check_token(token).get('token_status'):
+    auth_user = helper_functions.auth_context(token)
+    if auth_user.get('token_status'):
         raise error.InputError(description="Token invalid")
 
-    auth_id = helper_functions.check_token(token).get('u_id')
+    auth_id = auth_user.get('u_id')
 
     #If token is in channel
     if helper_functions.check_u_id_in_channel(auth_id, channel_id):
@@ -64,13 +68,44 @@ def channel_invite(token, channel_id, u_id):
 
     # add to user to channel if everything is valid 
     # details_user =  {u_id, email, name_first, name_last, handle_str}   
-    for user in channels.channel_data:
-        if user.get("channel_id") == channel_id: 
-            user["member_ids"].append(u_id)
-            break
+    channels.add_member(channels.channel_data[channel_id], u_id)
 
     return {}
 
+def channel_invite_bulk(token, channel_id, u_ids):
+    '''
+    Inviting many users to join the channel, returns a result for each u_id in the same order.
+    '''
+    #Checked invalid channel
+    if helper_functions.check_channelid_valid(channel_id):
+        raise error.InputError("Channel not valid")
+
+    # user token is invalid 
+    auth_user = helper_functions.auth_context(token)
+    if auth_user.get('token_status'):
+        raise error.InputError(description="Token invalid")
+
+    #If token is in channel
+    if helper_functions.check_u_id_in_channel(auth_user.get('u_id'), channel_id):
+        raise error.AccessError("Authorised user not in channel")
+
+    #Check every u_id, including ones repeated in the list
+    curr_channel = channels.channel_data[channel_id]
+    results = []
+    new_members = {}
+    for u_id in u_ids:
+        if helper_functions.check_uid_valid(u_id):
+            results.append({'u_id': u_id, 'error': "User not valid"})
+        elif u_id in curr_channel['member_ids'] or u_id in new_members:
+            results.append({'u_id': u_id, 'error': "Already in channel"})
+        else:
+            new_members[u_id] = None
+            results.append({'u_id': u_id})
+
+    channels.add_members(curr_channel, list(new_members))
+
+    return {'results': results}
+
 #Use channel_data_base. 
 def channel_details(token, channel_id):
     '''
@@ -81,57 +116,112 @@ def channel_details(token, channel_id):
         raise error.InputError("Channel not valid")
     
     # user token is invalid 
-    if helper_functions.check_token(token).get('token_status'):
+    auth_user = helper_functions.auth_context(token)
+    if auth_user.get('token_status'):
         raise error.InputError(description="Token invalid")
 
-    user_id = helper_functions.check_token(token).get('u_id')
+    user_id = auth_user.get('u_id')
 
     #User already in channel 
     if helper_functions.check_u_id_in_channel(user_id, channel_id):
         raise error.AccessError("Not in channel")
 
     #return details about channel  
+    return helper_details(channel_id)
+
+def helper_member_details(u_id):
+    '''
+    Return the member entry shown for u_id.
+    '''
+    user_detail = auth.registered_users[u_id]
+    return {
+        'u_id': u_id,
+        'name_first': user_detail['first_name'],
+        'name_last': user_detail['last_name'],
+        'profile_img_url': user_detail['profile_img_url'],
+    }
+
+def helper_details(channel_id):
+    '''
+    Return the details of the channel, built once until the members change.
+    '''
+    if channel_id in channels.details_cache:
+        return channels.details_cache[channel_id]
+
+    curr_channel = channels.channel_data[channel_id]
     channel_detail = {
-        'name': 'name',
-        'owner_members': [],
-        'all_members': [],
+        'name': curr_channel['name'],
+        'owner_members': [helper_member_details(user) for user in curr_channel.get("owner_ids")],
+        'all_members': [helper_member_details(user) for user in curr_channel.get("member_ids")],
+    }
+
+    channels.details_cache[channel_id] = channel_detail
+    channels.member_positions[channel_id] = {
+        user: index for index, user in enumerate(curr_channel.get("member_ids"))
     }
-    
-    for curr_channels in channels.list_of_all_channels:
-        if curr_channels.get('channel_id') == channel_id:
-            channel_detail['name'] = curr_channels['name']
-            break
-
-    for curr_channels in channels.channel_data:
-        if curr_channels.get('channel_id') == channel_id:
-            user_ids = curr_channels.get("member_ids")
-            for user in user_ids:
-                for user_detail in auth.registered_users:
-                    if user_detail['u_id'] == user:
-                        member_details = {
-                            'u_id': user,
-                            'name_first': user_detail['first_name'],
-                            'name_last': user_detail['last_name'],
-                            'profile_img_url': user_detail['profile_img_url'],
-                        }
-                        channel_detail['all_members'].append(member_details)
-
-    for curr_channels in channels.channel_data:
-        if curr_channels.get('channel_id') == channel_id:
-            user_ids = curr_channels.get("owner_ids")
-            for user in user_ids:
-                for user_detail in auth.registered_users:
-                    if user_detail['u_id'] == user:
-                        owner_details = {
-                            'u_id': user,
-                            'name_first': user_detail['first_name'],
-                            'name_last': user_detail['last_name'],
-                            'profile_img_url': user_detail['profile_img_url'],
-                        }
-                        channel_detail['owner_members'].append(owner_details)
-                             
     return channel_detail 
 
+def channel_details_summary(token, channel_id):
+    '''
+    Presenting the name, owners and member counts of the channel without the members.
+    '''
+    #Checked invalid channel
+    if helper_functions.check_channelid_valid(channel_id):
+        raise error.InputError("Channel not valid")
+    
+    # user token is invalid 
+    auth_user = helper_functions.auth_context(token)
+    if auth_user.get('token_status'):
+        raise error.InputError(description="Token invalid")
+
+    #User already in channel 
+    if helper_functions.check_u_id_in_channel(auth_user.get('u_id'), channel_id):
+        raise error.AccessError("Not in channel")
+
+    curr_channel = channels.channel_data[channel_id]
+    return {
+        'name': curr_channel['name'],
+        'owner_members': [helper_member_details(user) for user in curr_channel.get("owner_ids")],
+        'owner_count': len(curr_channel.get("owner_ids")),
+        'member_count': len(curr_channel.get("member_ids")),
+    }
+
+def channel_members(token, channel_id, after=None, limit=50):
+    '''
+    Return up to limit members who joined after the member after, in join order.
+    '''
+    #Checked invalid channel
+    if helper_functions.check_channelid_valid(channel_id):
+        raise error.InputError("Channel not valid")
+    
+    # user token is invalid 
+    auth_user = helper_functions.auth_context(token)
+    if auth_user.get('token_status'):
+        raise error.InputError(description="Token invalid")
+
+    #User already in channel 
+    if helper_functions.check_u_id_in_channel(auth_user.get('u_id'), channel_id):
+        raise error.AccessError("Not in channel")
+
+    if limit < 1:
+        raise error.InputError("Limit must be at least 1")
+
+    members = helper_details(channel_id)['all_members']
+    positions = channels.member_positions[channel_id]
+    if after is None:
+        first = 0
+    elif after in positions:
+        first = positions[after] + 1
+    else:
+        raise error.InputError("User not in channel")
+
+    page = members[first:first + limit]
+
+    #The last member returned is the cursor for the next page, None when there are no more
+    end = page[-1]['u_id'] if first + limit < len(members) else None
+
+    return {'members': page, 'after': after, 'end': end}
+
 def channel_messages(token, channel_id, start):
     '''
     Return up to 50 messages.
@@ -142,21 +232,19 @@ def channel_messages(token, channel_id, start):
     
 
     # user token is invalid 
-    if helper_functions.check_token(token).get('token_status'):
+    auth_user = helper_functions.auth_context(token)
+    if auth_user.get('token_status'):
         raise error.InputError(description="Token invalid")
 
-    u_id = helper_functions.check_token(token).get("u_id")
+    u_id = auth_user.get('u_id')
     
     #User already in channel 
     if helper_functions.check_u_id_in_channel(u_id, channel_id):
         raise error.AccessError("Not in channel")
 
-    #return messages 
-    for channel in channels.channel_data:
-        if channel.get("channel_id") == channel_id:
-            messages = channel.get("messages")
-            messages = list(reversed(messages))
-            num_messages = len(messages)
+    #return messages, read from the newest end of the log
+    messages = channels.channel_data[channel_id].get("messages")
+    num_messages = message_log.length(messages)
 
     if num_messages == 0 and start == 0:
         return {"messages": [], "start": start, "end": -1}
@@ -165,54 +253,71 @@ def channel_messages(token, channel_id, start):
     if start >= num_messages:
         raise error.InputError("Start value older than latest message")
     
-    #Append message to a list
-    index_message = start
-    end = int(index_message) + 50
-    counter = 0
+    #Message number start counts back from the newest
+    end = start + 50
     return_messages = []
+    for msg in itertools.islice(message_log.newest(messages, start), 50):
+        return_messages.append(helper_functions.format_message(msg, u_id))
 
-    
-    while counter < 50:
-        get_index = start + counter
-        if get_index >= end or get_index >= num_messages:
-            break
-
-        #Seeing if user has reacted
-        is_this_user_reacted = False
-
-        if u_id in messages[get_index].get('reacts')[0]['u_ids']:
-            is_this_user_reacted = True 
-            
-        newmsg = {
-            'message_id': messages[get_index].get('message_id'),
-            'u_id': messages[get_index].get('user_id'),
-            'message': messages[get_index].get('message_sent'),
-            'time_created': messages[get_index].get('time_created'),
-            'reacts': [{ 
-                'react_id': messages[get_index].get('reacts')[0].get('react_id'),
-                'u_ids': messages[get_index].get('reacts')[0].get('u_ids'),   
-                'is_this_user_reacted': is_this_user_reacted,
-            }],
-            'is_pinned':messages[get_index].get('is_pinned')
-        }
-        return_messages.append(newmsg)
-        counter += 1
-                
-    if counter < 50:
+    if len(return_messages) < 50:
         end = -1
 
     return {"messages": return_messages, "start": start, "end": end}
 
+def channel_messages_before(token, channel_id, before=None, limit=50):
+    '''
+    Return up to limit messages sent before the message_id before, newest first.
+    '''
+    #Checked invalid channel
+    if helper_functions.check_channelid_valid(channel_id):
+        raise error.InputError("Channel not valid")
+
+    # user token is invalid 
+    auth_user = helper_functions.auth_context(token)
+    if auth_user.get('token_status'):
+        raise error.InputError(description="Token invalid")
+
+    u_id = auth_user.get('u_id')
+
+    #User already in channel 
+    if helper_functions.check_u_id_in_channel(u_id, channel_id):
+        raise error.AccessError("Not in channel")
+
+    if limit < 1:
+        raise error.InputError("Limit must be at least 1")
+
+    #Start from the newest message when there is no cursor
+    messages = channels.channel_data[channel_id].get("messages")
+    if before is None:
+        page = message_log.newest(messages)
+    elif message_log.has_slot(messages, before):
+        #The cursor message may have been removed since it was returned
+        page = message_log.older(messages, before)
+    else:
+        raise error.InputError("Message not in channel")
+
+    #Read one extra message to know if there is another page
+    page = list(itertools.islice(page, limit + 1))
+    return_messages = []
+    for msg in page[:limit]:
+        return_messages.append(helper_functions.format_message(msg, u_id))
+
+    #The oldest message returned is the cursor for the next page
+    end = page[limit - 1]['message_id'] if len(page) > limit else -1
+
+    return {"messages": return_messages, "before": before, "end": end}
+
 #Use channel_data_base. Simply have to remove u_id from all_members. 
 def channel_leave(token, channel_id):
     '''
     When a user leaves the channel.
     '''
     # user token is invalid 
-    if helper_functions.check_token(token).get('token_status'):
+    auth_user = helper_functions.auth_context(token)
+    if auth_user.get('token_status'):
         raise error.InputError(description="Token invalid")
 
-    user_id = helper_functions.check_token(token).get("u_id")
+    user_id = auth_user.get('u_id')
     
     #Checked invalid channel
     if helper_functions.check_channelid_valid(channel_id):
@@ -223,13 +328,7 @@ def channel_leave(token, channel_id):
     if helper_functions.check_u_id_in_channel(user_id, channel_id):
         raise error.AccessError("Already in channel")
 
-    for current_channel in channels.channel_data:
-        if current_channel.get("channel_id") == channel_id:
-            for members in current_channel.get("member_ids"):
-                if user_id == members:
-                    current_channel["member_ids"].remove(user_id)
-                    break
-            break
+    channels.remove_member(channels.channel_data[channel_id], user_id)
 
     return {}
 
@@ -239,40 +338,27 @@ def channel_join(token, channel_id):
     When a user joins the channel.
     '''
     # user token is invalid 
-    if helper_functions.check_token(token).get('token_status'):
+    auth_user = helper_functions.auth_context(token)
+    if auth_user.get('token_status'):
         raise error.InputError(description="Token invalid")
 
-    user_id = helper_functions.check_token(token).get("u_id")
+    user_id = auth_user.get('u_id')
     
     #Checked invalid channel
     if helper_functions.check_channelid_valid(channel_id):
         raise error.InputError("Channel not valid")
     
+    current_channel = channels.channel_data[channel_id]
+
     # channel is private 
-    channel_is_public = False
-    for chan_status in channels.channel_data: 
-        if chan_status['channel_id'] == channel_id:
-            if chan_status['is_public'] == True:
-                channel_is_public = True 
-                break
-    
-    if channel_is_public == False: 
+    if current_channel['is_public'] == False: 
         raise error.AccessError("Channel is private")
     
     #If flock owner add to owner
-    for user in auth.registered_users:
-        if user.get('u_id') == user_id:
-            if user.get('permissions') == 1:
-                    #Append u_id to list of owners
-                    for user in channels.channel_data:
-                        if user.get("channel_id") == channel_id:
-                             user.get("owner_ids").append(user_id)
-                             user.get("member_ids").append(user_id)
-                             return {}
-
-    for current_channel in channels.channel_data:
-        if channel_id == current_channel['channel_id']:     
-            current_channel["member_ids"].append(user_id)
+    if auth_user['user'].get('permissions') == 1:
+        channels.add_owner(current_channel, user_id)
+
+    channels.add_member(current_channel, user_id)
             
     return {}  
 
@@ -287,14 +373,19 @@ def channel_addowner(token, channel_id, u_id):
         raise error.InputError("Channel not valid")
 
     # user token is invalid 
-    if helper_functions.check_token(token).get('token_status'):
+    auth_user = helper_functions.auth_context(token)
+    if auth_user.get('token_status'):
         raise error.InputError(description="Token invalid")
 
-    u_id_for_token = helper_functions.check_token(token).get("u_id")
+    u_id_for_token = auth_user.get('u_id')
   
     #Check if they are an owner
     if helper_functions.check_uid_owner_in_channel(u_id_for_token, channel_id):
         raise error.AccessError("Authorised user not in channel or flockr owner")
+
+    #u_id must belong to a user
+    if helper_functions.check_uid_valid(u_id):
+        raise error.InputError("u_id does not refer to a valid user")
     
     #If u_id already owner
     if helper_functions.check_uid_owner_in_channel(u_id, channel_id) == False:
@@ -302,10 +393,7 @@ def channel_addowner(token, channel_id, u_id):
 
 
     #Append u_id to list of owners
-    for user in channels.channel_data:
-        if user.get("channel_id") == channel_id:
-            user.get("owner_ids").append(u_id)
-            break
+    channels.add_owner(channels.channel_data[channel_id], u_id)
      
     return {}
 
@@ -321,29 +409,20 @@ def channel_removeowner(token, channel_id, u_id):
 
     
     # user token is invalid 
-    if helper_functions.check_token(token).get('token_status'):
+    auth_user = helper_functions.auth_context(token)
+    if auth_user.get('token_status'):
         raise error.InputError(description="Token invalid")
 
-    u_id_for_token = helper_functions.check_token(token).get("u_id")
+    u_id_for_token = auth_user.get('u_id')
           
     #If user is an owner
     if helper_functions.check_uid_owner_in_channel(u_id_for_token, channel_id):
         raise error.AccessError("Authorised user not in channel or flockr owner")
     
     #Check if u_id is an owner. If so then remove
-    u_id_not_owner = True
-    for user in channels.channel_data:
-        if user.get('channel_id') == channel_id:
-            #check if u_id is owner
-            for owner in user.get('owner_ids'):
-                if owner == u_id:
-                    u_id_not_owner = False
-                    user['owner_ids'].remove(owner)
-                    break
-        if u_id_not_owner == False:
-            break 
-    
-    if u_id_not_owner == True:
+    if helper_functions.check_uid_owner_in_channel(u_id, channel_id):
         raise error.InputError("U_id not an owner")
 
+    channels.remove_owner(channels.channel_data[channel_id], u_id)
+
     return {}
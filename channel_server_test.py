@@ -98,6 +98,49 @@ def test_channel_invite_valid(url):
     assert len(payload_listall['channels']) == 1
     assert payload_listall['channels'][0]['channel_id'] == payload_create['channel_id']
 
+def test_channel_invite_bulk(url):
+    '''
+    Testing if bulk invite works on server.
+    '''
+    requests.delete(f"{url}/clear")
+
+    auth_register_1 = requests.post(f"{url}/auth/register", json={
+        'email': 'testemail1@gmail.com', 
+        'password': 'testpassword1', 
+        'name_first': 'Firstname1', 
+        'name_last': 'Lastname1'
+    })
+    payload_user_1 = auth_register_1.json()
+    auth_register_2 = requests.post(f"{url}/auth/register", json={
+        'email': 'testemail2@gmail.com', 
+        'password': 'testpassword2', 
+        'name_first': 'Firstname2', 
+        'name_last': 'Lastname2'
+    })
+    payload_user_2 = auth_register_2.json()
+
+    channels_create_return = requests.post(f"{url}/channels/create", json={
+        'token': payload_user_1['token'], 
+        'name': 'testchannel', 
+        'is_public': False
+    })
+    payload_create = channels_create_return.json()
+
+    invite_return = requests.post(f"{url}/channel/invite/bulk", json={
+        'token': payload_user_1['token'], 
+        'channel_id': payload_create['channel_id'], 
+        'u_ids': [payload_user_2['u_id'], 99]
+    })
+    payload_invite = invite_return.json()
+
+    assert payload_invite['results'] == [
+        {'u_id': payload_user_2['u_id']},
+        {'u_id': 99, 'error': 'User not valid'},
+    ]
+
+    channel_server_detail = requests.get(f"{url}/channel/details?token={payload_user_2['token']}&channel_id={payload_create['channel_id']}")
+    assert len(channel_server_detail.json()['all_members']) == 2
+
 def test_channel_invite_private(url):
     '''
     Testing if channel_invite works on server when channel is private.
@@ -338,6 +381,55 @@ def test_channel_details_valid(url):
     assert payload_detail['owner_members'][0]['name_first'] == 'Firstname1'
     assert payload_detail['owner_members'][1]['name_first'] == 'Firstname2'
 
+def test_channel_details_summary_and_members(url):
+    '''
+    Testing the summary details and paged members on server.
+    '''
+    requests.delete(f"{url}/clear")
+
+    auth_register_1 = requests.post(f"{url}/auth/register", json={
+        'email': 'testemail1@gmail.com', 
+        'password': 'testpassword1', 
+        'name_first': 'Firstname1', 
+        'name_last': 'Lastname1'
+    })
+    payload_user_1 = auth_register_1.json()
+    auth_register_2 = requests.post(f"{url}/auth/register", json={
+        'email': 'testemail2@gmail.com', 
+        'password': 'testpassword2', 
+        'name_first': 'Firstname2', 
+        'name_last': 'Lastname2'
+    })
+    payload_user_2 = auth_register_2.json()
+
+    channels_create_return = requests.post(f"{url}/channels/create", json={
+        'token': payload_user_1['token'], 
+        'name': 'testchannel', 
+        'is_public': True
+    })
+    payload_create = channels_create_return.json()
+
+    requests.post(f"{url}/channel/join", json={
+        'token': payload_user_2['token'],
+        'channel_id': payload_create['channel_id']
+    })
+
+    channel_server_summary = requests.get(f"{url}/channel/details/summary?token={payload_user_1['token']}&channel_id={payload_create['channel_id']}")
+    payload_summary = channel_server_summary.json()
+    assert payload_summary['name'] == 'testchannel'
+    assert payload_summary['member_count'] == 2
+    assert payload_summary['owner_count'] == 1
+    assert 'all_members' not in payload_summary
+
+    channel_server_members = requests.get(f"{url}/channel/members?token={payload_user_1['token']}&channel_id={payload_create['channel_id']}&limit=1")
+    payload_members = channel_server_members.json()
+    assert [member['name_first'] for member in payload_members['members']] == ['Firstname1']
+
+    channel_server_members = requests.get(f"{url}/channel/members?token={payload_user_1['token']}&channel_id={payload_create['channel_id']}&after={payload_members['end']}&limit=1")
+    payload_members = channel_server_members.json()
+    assert [member['name_first'] for member in payload_members['members']] == ['Firstname2']
+    assert payload_members['end'] is None
+
 def test_channel_details_private(url):
     '''
     Testing if channel_details works on server when channel is private.
@@ -997,7 +1089,7 @@ def test_channel_join_already_in(url):
 
     assert channel_server_detail.status_code == 200
 
-    assert len(payload_detail['all_members']) == 3
+    assert len(payload_detail['all_members']) == 2
     assert payload_detail['all_members'][0]['name_first'] == 'Firstname1'
     assert payload_detail['all_members'][1]['name_first'] == 'Firstname2'
 
@@ -1526,6 +1618,43 @@ def test_channel_messages(url):
     
     assert payload4['messages'][0].get('message') == 'hi'
 
+def test_channel_messages_cursor(url):
+    '''
+    Testing the before and limit cursor mode of messages.
+    '''
+    requests.delete(f"{url}/clear")
+
+    auth_reg1 = requests.post(f"{url}/auth/register", json={
+        'email': 'sand@gmail.com', 
+        'password': 'password', 
+        'name_first': 'sand', 
+        'name_last': 'sou'
+    })
+    payload1 = auth_reg1.json()
+
+    channel_create = requests.post(f"{url}/channels/create", json={
+        'token': payload1['token'], 
+        'name': 'chan', 
+        'is_public': True
+    })
+    payload3 = channel_create.json()
+
+    for text in ('one', 'two', 'three'):
+        requests.post(f"{url}/message/send", json={
+            'token': payload1['token'], 
+            'channel_id': payload3['channel_id'], 
+            'message': text
+        })
+
+    channel_messages = requests.get(f"{url}/channel/messages?token={payload1['token']}&channel_id={payload3['channel_id']}&limit=2")
+    payload4 = channel_messages.json()
+    assert [msg['message'] for msg in payload4['messages']] == ['three', 'two']
+
+    channel_messages = requests.get(f"{url}/channel/messages?token={payload1['token']}&channel_id={payload3['channel_id']}&before={payload4['end']}&limit=2")
+    payload5 = channel_messages.json()
+    assert [msg['message'] for msg in payload5['messages']] == ['one']
+    assert payload5['end'] == -1
+
 def test_channel_messages_invalid_channel_id(url):
     '''
     Testing for invalid channel id.
@@ -5,8 +5,9 @@ import pytest
 from error import InputError, AccessError 
 from channels import channels_create
 from auth import auth_register
-from channel import channel_invite, channel_details, channel_messages, channel_leave, channel_join, channel_addowner, channel_removeowner
-from message import message_send
+from channel import channel_invite, channel_details, channel_messages, channel_leave, channel_join, channel_addowner, channel_removeowner, channel_messages_before, channel_members, channel_details_summary, channel_invite_bulk
+from message import message_send, message_remove
+from user import user_profile_setname
 from other import clear
 
 #################################################################################
@@ -54,6 +55,18 @@ def test_addowner_no_id():
     with pytest.raises(InputError):
         channel_addowner(user_token, "", "")
 
+def test_addowner_unknown_user():
+    '''
+    Testing when u_id doesn't belong to any user, which would break channel_details.
+    '''
+    clear()
+    user = auth_register("user@gmail.com", "password", "Firstname", "Lastname")
+    channel_id = channels_create(user['token'], "username", True)['channel_id']
+
+    with pytest.raises(InputError):
+        channel_addowner(user['token'], channel_id, 999)
+    assert [member['u_id'] for member in channel_details(user['token'], channel_id)['owner_members']] == [user['u_id']]
+
 def test_addowner_already_owner():
     '''
     Testing when an owner is being added as an owner to the channel.
@@ -765,3 +778,234 @@ def test_return_morethan50message():
 
 
 
+
+def test_messages_page_through_all():
+    '''
+    Testing that paging from start 0 returns every message once, newest first.
+    '''
+    clear()
+    user = auth_register("test@gmail.com", 'erenyaegar', 'ando', 'ackermann')
+    user_token = user.get("token")
+    channel_id = channels_create(user_token, "channel1", True).get('channel_id')
+    for counter in range(120):
+        message_send(user_token, channel_id, f"{counter}")
+
+    seen = []
+    start = 0
+    while start != -1:
+        page = channel_messages(user_token, channel_id, start)
+        assert page['start'] == start
+        seen.extend(msg['message'] for msg in page['messages'])
+        start = page['end']
+
+    assert seen == [f"{counter}" for counter in reversed(range(120))]
+    assert len(channel_messages(user_token, channel_id, 100)['messages']) == 20
+
+def test_messages_before_pages():
+    '''
+    Testing that following the cursor returns every message once, newest first.
+    '''
+    clear()
+    user = auth_register("test@gmail.com", 'erenyaegar', 'ando', 'ackermann')
+    user_token = user.get("token")
+    channel_id = channels_create(user_token, "channel1", True).get('channel_id')
+    for counter in range(25):
+        message_send(user_token, channel_id, f"{counter}")
+
+    seen = []
+    before = None
+    while before != -1:
+        page = channel_messages_before(user_token, channel_id, before, 10)
+        assert len(page['messages']) <= 10
+        seen.extend(msg['message'] for msg in page['messages'])
+        before = page['end']
+
+    assert seen == [f"{counter}" for counter in reversed(range(25))]
+
+def test_messages_before_after_remove():
+    '''
+    Testing that the cursor still lines up after an older message is removed.
+    '''
+    clear()
+    user = auth_register("test@gmail.com", 'erenyaegar', 'ando', 'ackermann')
+    user_token = user.get("token")
+    channel_id = channels_create(user_token, "channel1", True).get('channel_id')
+    message_ids = [message_send(user_token, channel_id, f"{counter}")['message_id']
+                   for counter in range(6)]
+
+    page = channel_messages_before(user_token, channel_id, None, 2)
+    assert [msg['message'] for msg in page['messages']] == ["5", "4"]
+
+    message_remove(user_token, message_ids[1])
+    page = channel_messages_before(user_token, channel_id, page['end'], 2)
+    assert [msg['message'] for msg in page['messages']] == ["3", "2"]
+    page = channel_messages_before(user_token, channel_id, page['end'], 2)
+    assert [msg['message'] for msg in page['messages']] == ["0"]
+    assert page['end'] == -1
+
+def test_messages_before_cursor_removed():
+    '''
+    Testing that paging carries on when the cursor message itself is removed.
+    '''
+    clear()
+    user = auth_register("test@gmail.com", 'erenyaegar', 'ando', 'ackermann')
+    user_token = user.get("token")
+    channel_id = channels_create(user_token, "channel1", True).get('channel_id')
+    for counter in range(6):
+        message_send(user_token, channel_id, f"{counter}")
+
+    page = channel_messages_before(user_token, channel_id, None, 2)
+    assert [msg['message'] for msg in page['messages']] == ["5", "4"]
+
+    message_remove(user_token, page['end'])
+    page = channel_messages_before(user_token, channel_id, page['end'], 2)
+    assert [msg['message'] for msg in page['messages']] == ["3", "2"]
+
+def test_messages_before_invalid_cursor():
+    '''
+    Testing a cursor that isn't a message in the channel and a bad limit.
+    '''
+    clear()
+    user = auth_register("test@gmail.com", 'erenyaegar', 'ando', 'ackermann')
+    user_token = user.get("token")
+    channel_id = channels_create(user_token, "channel1", True).get('channel_id')
+    other_channel = channels_create(user_token, "channel2", True).get('channel_id')
+    message_id = message_send(user_token, other_channel, "elsewhere")['message_id']
+
+    with pytest.raises(InputError):
+        channel_messages_before(user_token, channel_id, message_id, 10)
+    with pytest.raises(InputError):
+        channel_messages_before(user_token, channel_id, None, 0)
+
+def test_details_cached_until_changed():
+    '''
+    Testing that channel_details is reused until the members, owners or names change.
+    '''
+    clear()
+    first_user = auth_register("test@gmail.com", "password", "Firstname", "Lastname")
+    second_user = auth_register("john@gmail.com", "johnny", "John", "Johnson")
+    channel_id = channels_create(first_user.get("token"), "channel1", True).get("channel_id")
+
+    details = channel_details(first_user.get("token"), channel_id)
+    assert channel_details(first_user.get("token"), channel_id) is details
+
+    channel_join(second_user.get("token"), channel_id)
+    details = channel_details(first_user.get("token"), channel_id)
+    assert [member['u_id'] for member in details['all_members']] == [0, 1]
+
+    channel_addowner(first_user.get("token"), channel_id, second_user.get("u_id"))
+    details = channel_details(first_user.get("token"), channel_id)
+    assert [owner['u_id'] for owner in details['owner_members']] == [0, 1]
+
+    user_profile_setname(second_user.get("token"), "Johnny", "Johnson")
+    details = channel_details(first_user.get("token"), channel_id)
+    assert details['all_members'][1]['name_first'] == "Johnny"
+
+def test_details_owner_who_left_renamed():
+    '''
+    Testing that an owner who left the channel still shows their new name.
+    '''
+    clear()
+    first_user = auth_register("test@gmail.com", "password", "Firstname", "Lastname")
+    channel_id = channels_create(first_user.get("token"), "channel1", True).get("channel_id")
+    second_user = auth_register("john@gmail.com", "johnny", "John", "Johnson")
+    channel_join(second_user.get("token"), channel_id)
+    channel_leave(first_user.get("token"), channel_id)
+
+    channel_details(second_user.get("token"), channel_id)
+    user_profile_setname(first_user.get("token"), "Renamed", "Lastname")
+    details = channel_details(second_user.get("token"), channel_id)
+    assert details['owner_members'][0]['name_first'] == "Renamed"
+
+def test_members_pages():
+    '''
+    Testing that following the members cursor returns every member once in join order.
+    '''
+    clear()
+    users = [auth_register(f"user{i}@gmail.com", "password", "First", "Last") for i in range(7)]
+    channel_id = channels_create(users[0].get("token"), "channel1", True).get("channel_id")
+    for user in users[1:]:
+        channel_join(user.get("token"), channel_id)
+
+    seen = []
+    page = channel_members(users[0].get("token"), channel_id, None, 3)
+    seen.extend(member['u_id'] for member in page['members'])
+    while page['end'] is not None:
+        page = channel_members(users[0].get("token"), channel_id, page['end'], 3)
+        seen.extend(member['u_id'] for member in page['members'])
+
+    assert seen == [user['u_id'] for user in users]
+
+def test_members_invalid_cursor():
+    '''
+    Testing a members cursor that isn't a member of the channel and a bad limit.
+    '''
+    clear()
+    first_user = auth_register("test@gmail.com", "password", "Firstname", "Lastname")
+    second_user = auth_register("john@gmail.com", "johnny", "John", "Johnson")
+    channel_id = channels_create(first_user.get("token"), "channel1", True).get("channel_id")
+
+    with pytest.raises(InputError):
+        channel_members(first_user.get("token"), channel_id, second_user.get("u_id"), 10)
+    with pytest.raises(InputError):
+        channel_members(first_user.get("token"), channel_id, None, 0)
+    with pytest.raises(AccessError):
+        channel_members(second_user.get("token"), channel_id, None, 10)
+
+def test_details_summary():
+    '''
+    Testing that the summary has the owners and counts but not the members.
+    '''
+    clear()
+    first_user = auth_register("test@gmail.com", "password", "Firstname", "Lastname")
+    second_user = auth_register("john@gmail.com", "johnny", "John", "Johnson")
+    channel_id = channels_create(first_user.get("token"), "channel1", True).get("channel_id")
+    channel_join(second_user.get("token"), channel_id)
+
+    summary = channel_details_summary(second_user.get("token"), channel_id)
+    assert summary == {
+        'name': 'channel1',
+        'owner_members': [{
+            'u_id': first_user.get("u_id"),
+            'name_first': 'Firstname',
+            'name_last': 'Lastname',
+            'profile_img_url': None,
+        }],
+        'owner_count': 1,
+        'member_count': 2,
+    }
+
+def test_invite_bulk():
+    '''
+    Testing that a bulk invite adds the valid users and reports the rest.
+    '''
+    clear()
+    users = [auth_register(f"user{i}@gmail.com", "password", "First", "Last") for i in range(4)]
+    channel_id = channels_create(users[0].get("token"), "channel1", False).get("channel_id")
+    channel_invite(users[0].get("token"), channel_id, users[1].get("u_id"))
+
+    result = channel_invite_bulk(users[0].get("token"), channel_id, [2, 1, 99, 3, 2])
+    assert result == {'results': [
+        {'u_id': 2},
+        {'u_id': 1, 'error': "Already in channel"},
+        {'u_id': 99, 'error': "User not valid"},
+        {'u_id': 3},
+        {'u_id': 2, 'error': "Already in channel"},
+    ]}
+
+    details = channel_details(users[3].get("token"), channel_id)
+    assert [member['u_id'] for member in details['all_members']] == [0, 1, 2, 3]
+
+def test_invite_bulk_not_in_channel():
+    '''
+    Testing that only channel members can bulk invite.
+    '''
+    clear()
+    first_user = auth_register("test@gmail.com", "password", "Firstname", "Lastname")
+    second_user = auth_register("john@gmail.com", "johnny", "John", "Johnson")
+    channel_id = channels_create(first_user.get("token"), "channel1", True).get("channel_id")
+
+    with pytest.raises(AccessError):
+        channel_invite_bulk(second_user.get("token"), channel_id, [second_user.get("u_id")])
+    with pytest.raises(InputError):
+        channel_invite_bulk(first_user.get("token"), channel_id + 1, [second_user.get("u_id")])
@@ -1,12 +1,138 @@
 '''
 Imported files for channels.
 '''
+import bisect
 import auth
 import error
 import helper_functions
+import message_log
 
-list_of_all_channels = []
-channel_data = [] # the status, owner id, member id, channel id, messages
+# {channel_id: {status, owner ids, member ids, channel id, messages, name}}
+# owner_ids and member_ids are {u_id: None} so lookups are O(1) and join order is kept
+channel_data = {}
+# channels_listall views of all and of public channels, None until rebuilt after a channel is created
+listing = {'channels': None, 'public': None}
+name_index = [] # sorted [(name, channel_id)] for name prefix searches
+message_locations = {} # {message_id: (channel_id, slot in the channel's message log)}
+user_channels = {} # {u_id: set of channel_ids the user is a member of}
+owner_channels = {} # {u_id: set of channel_ids the user is an owner of}
+details_cache = {} # {channel_id: channel_details return value}
+member_positions = {} # {channel_id: {u_id: index in the cached all_members}}
+
+def invalidate_details(channel_id):
+    '''
+    Drops the cached channel_details of a channel.
+    '''
+    details_cache.pop(channel_id, None)
+    member_positions.pop(channel_id, None)
+
+def invalidate_user_details(u_id):
+    '''
+    Drops the cached channel_details of every channel listing u_id.
+    '''
+    for channel_id in user_channels.get(u_id, set()) | owner_channels.get(u_id, set()):
+        invalidate_details(channel_id)
+
+def add_member(channel, u_id):
+    '''
+    Adds u_id to a channel's members and the user_channels index.
+    '''
+    channel['member_ids'][u_id] = None
+    user_channels.setdefault(u_id, set()).add(channel['channel_id'])
+    invalidate_details(channel['channel_id'])
+
+def add_members(channel, u_ids):
+    '''
+    Adds many u_ids to a channel's members and the user_channels index at once.
+    '''
+    channel['member_ids'].update(dict.fromkeys(u_ids))
+    for u_id in u_ids:
+        user_channels.setdefault(u_id, set()).add(channel['channel_id'])
+    invalidate_details(channel['channel_id'])
+
+def remove_member(channel, u_id):
+    '''
+    Removes u_id from a channel's members and the user_channels index.
+    '''
+    del channel['member_ids'][u_id]
+    user_channels[u_id].discard(channel['channel_id'])
+    invalidate_details(channel['channel_id'])
+
+def add_owner(channel, u_id):
+    '''
+    Adds u_id to a channel's owners and the owner_channels index.
+    '''
+    channel['owner_ids'][u_id] = None
+    owner_channels.setdefault(u_id, set()).add(channel['channel_id'])
+    invalidate_details(channel['channel_id'])
+
+def remove_owner(channel, u_id):
+    '''
+    Removes u_id from a channel's owners and the owner_channels index.
+    '''
+    del channel['owner_ids'][u_id]
+    owner_channels[u_id].discard(channel['channel_id'])
+    invalidate_details(channel['channel_id'])
+
+def add_message(channel, msg):
+    '''
+    Appends msg to a channel's message log and the message_locations index.
+    '''
+    slot = message_log.append(channel['messages'], msg)
+    message_locations[msg['message_id']] = (channel['channel_id'], slot)
+
+def remove_message(channel, message_id):
+    '''
+    Removes a message from a channel's message log and the message_locations index.
+    '''
+    del message_locations[message_id]
+    if message_log.remove(channel['messages'], message_id):
+        # Compaction moved the channel's messages to new slots
+        for moved_id, slot in channel['messages']['positions'].items():
+            message_locations[moved_id] = (channel['channel_id'], slot)
+
+def locate_message(message_id):
+    '''
+    Returns (channel, message) for message_id, or (None, None) if there is no such message.
+    '''
+    location = message_locations.get(message_id)
+    if location is None:
+        return None, None
+    channel = channel_data[location[0]]
+    return channel, message_log.at(channel['messages'], location[1])
+
+def listing_entry(channel):
+    '''
+    Returns the {channel_id, name} shown for a channel in channel lists.
+    '''
+    return {'channel_id': channel['channel_id'], 'name': channel['name']}
+
+def helper_listing(public_only=False):
+    '''
+    Returns the list of every channel, or every public channel. It is built once
+    and channels_create appends to it, so callers must not change it.
+    '''
+    view = 'public' if public_only else 'channels'
+    if listing[view] is None:
+        listing[view] = [listing_entry(channel) for channel in channel_data.values()
+                         if channel['is_public'] or not public_only]
+    return listing[view]
+
+def helper_prefix_listing(name_prefix, public_only, count=None):
+    '''
+    Returns the channels whose name starts with name_prefix, sorted by name.
+    Given a count, stops once that many are found.
+    '''
+    matches = []
+    index = bisect.bisect_left(name_index, (name_prefix,))
+    while index < len(name_index) and name_index[index][0].startswith(name_prefix):
+        if count is not None and len(matches) >= count:
+            break
+        channel = channel_data[name_index[index][1]]
+        if channel['is_public'] or not public_only:
+            matches.append(listing_entry(channel))
+        index += 1
+    return matches
 
 def channels_list(token):
     '''
@@ -14,56 +140,66 @@ def channels_list(token):
     '''
 
     # Checking is the token exist then getting their u_id
-    if helper_functions.check_token(token).get('token_status'):
+    auth_user = helper_functions.auth_context(token)
+    if auth_user.get('token_status'):
         raise error.InputError(description="Token invalid")
 
-    user_id = helper_functions.check_token(token).get('u_id')
+    user_id = auth_user.get('u_id')
     
     # List of channels that the user belongs to 
     user_channel = []
     
-    # Checking if the user is in the channel then append that channel to the user channel list
-    for channel in list_of_all_channels:            
-        channel_id = channel.get("channel_id")     
-        for data in channel_data:                   
-            if data['channel_id'] == channel_id:    
-                if user_id in data['member_ids']:   
-                    user_channel.append(channel)    
+    # Look up each channel the user is in
+    for channel_id in sorted(user_channels.get(user_id, ())):
+        user_channel.append(listing_entry(channel_data[channel_id]))
 
     return {'channels': user_channel}
 
-def channels_listall(token):
+def channels_listall(token, start=0, limit=None, public_only=False, name_prefix=None):
     '''
     Provides a list of all the channels and their details.
+    Given a limit, returns up to limit channels from start with the start of the next page as end.
     '''
    
     #Checking is the token exist then getting their u_id
-    if helper_functions.check_token(token).get('token_status'):
+    auth_user = helper_functions.auth_context(token)
+    if auth_user.get('token_status'):
         raise error.InputError(description="Token invalid")
     
-    # Returning the list of channels
-    
-    # output = {'channels': []}
-    # for channels_d in channel_data:
-    #     if channels_d['is_public'] == True:
-    #         detail = {
-    #             'channel_id': channels_d['channel_id'],
-    #             'name': channels_d['name']
-    #         }
-    #         output['channels'].append(detail)
+    if start < 0:
+        raise error.InputError("Start can not be negative")
 
-    
-    return {'channels': list_of_all_channels}
+    if limit is not None and limit < 1:
+        raise error.InputError("Limit must be at least 1")
+
+    # Returning the list of channels, optionally only public ones or by name prefix
+    if name_prefix is None:
+        all_channels = helper_listing(public_only)
+    elif limit is None:
+        all_channels = helper_prefix_listing(name_prefix, public_only)
+    else:
+        # One match past the page is enough to know if there is another
+        all_channels = helper_prefix_listing(name_prefix, public_only, start + limit + 1)
+
+    if limit is None:
+        return {'channels': all_channels[start:] if start else all_channels}
+
+    end = start + limit
+    if end >= len(all_channels):
+        end = -1
+
+    return {'channels': all_channels[start:start + limit], 'start': start, 'end': end}
 
 def channels_create(token, name, is_public):
     '''
     Creates a new channel that is either public or private.
     '''
     # Checking for a valid token 
-    if helper_functions.check_token(token).get('token_status'):
+    auth_user = helper_functions.auth_context(token)
+    if auth_user.get('token_status'):
         raise error.InputError(description="Token invalid")
     
-    user_id = helper_functions.check_token(token).get('u_id')
+    user_id = auth_user.get('u_id')
 
     # Error is the channel is greater than 20
     if len(name) > 20:
@@ -74,20 +210,15 @@ def channels_create(token, name, is_public):
         raise error.InputError("No channel name entered.")   
     
     # Assigning the channel id as the number of channels 
-    number_of_channels = len(list_of_all_channels)
+    number_of_channels = len(channel_data)
     channel_id = number_of_channels + 1
-    
-    channels_details = {
-        'channel_id': channel_id,
-        'name': name
-    }
 
     channel_data_base = {
-        'owner_ids': [],
-        'member_ids': [],
+        'owner_ids': {},
+        'member_ids': {},
         'channel_id': channel_id,
         'is_public': True,
-        'messages': [],
+        'messages': message_log.new_log(),
         'name': name
     }
     
@@ -95,14 +226,17 @@ def channels_create(token, name, is_public):
     channel_data_base['is_public'] = is_public
 
     # Adding the data of the channel
-    for user in auth.registered_tokens:
-        if token == user.get("token"):
-            user_id = user.get("u_id")
-            channel_data_base['owner_ids'].append(user_id)
-            channel_data_base['member_ids'].append(user_id)
+    add_owner(channel_data_base, user_id)
+    add_member(channel_data_base, user_id)
 
     # Adding the newly created channel into the list
-    channel_data.append(channel_data_base)
-    list_of_all_channels.append(channels_details)
+    channel_data[channel_id] = channel_data_base
+    # Channels never change name or visibility, so the cached lists just grow
+    entry = listing_entry(channel_data_base)
+    if listing['channels'] is not None:
+        listing['channels'].append(entry)
+    if listing['public'] is not None and is_public:
+        listing['public'].append(entry)
+    bisect.insort(name_index, (name, channel_id))
 
     return {'channel_id': channel_id}
\ No newline at end of file
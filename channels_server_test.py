@@ -74,6 +74,32 @@ def test_channels_create(url):
     assert payload3['channels'][0]['channel_id'] == payload2['channel_id']
     assert payload3['channels'][0]['name'] == "aaaaa"
 
+def test_channels_listall_filtered(url):
+    '''
+    Testing the listall page and filters on server.
+    '''
+    requests.delete(f"{url}/clear")
+    auth_reg = requests.post(f"{url}/auth/register", json={
+        'email': 'ando@gmail.com', 
+        'password': 'password', 
+        'name_first': 'ando', 
+        'name_last': 'pech'
+    })
+    payload = auth_reg.json()
+    for name, is_public in (('abc', True), ('abd', False), ('xyz', True)):
+        requests.post(f"{url}/channels/create", json={
+            'token': payload['token'], 
+            'name': name, 
+            'is_public': is_public
+        })
+
+    list_channel = requests.get(f"{url}/channels/listall?token={payload['token']}&public_only=true&name_prefix=ab&limit=5")
+    payload2 = list_channel.json()
+
+    assert list_channel.status_code == 200
+    assert [channel['name'] for channel in payload2['channels']] == ['abc']
+    assert payload2['end'] == -1
+
 def test_channels_create_private(url):
     '''
     Testing if channels_create works on server when the channel is private.
@@ -4,7 +4,8 @@ Imported files for channels_test.
 import pytest
 import error
 from channels import channels_create, channels_list, channels_listall
-from channel import channel_join
+import channels
+from channel import channel_join, channel_leave, channel_invite
 from auth import auth_register
 from other import clear
 
@@ -84,6 +85,38 @@ def test_user_one_channel():
     assert channel_list[0]["channel_id"] == channel4.get("channel_id")
     assert len(channel_list) == 1
 
+def test_list_after_leave_and_invite():
+    '''
+    Testing that channels_list follows joins, invites and leaves.
+    '''
+    clear()
+    user_1 = auth_register("userone@gmail.com", "passwordOne", "Firstone", "Lastone")
+    user_2 = auth_register("usertwo@gmail.com", "passwordTwo", "Firsttwo", "Lasttwo")
+    channel_1 = channels_create(user_1["token"], "channel1", True)["channel_id"]
+    channel_2 = channels_create(user_1["token"], "channel2", False)["channel_id"]
+
+    channel_join(user_2["token"], channel_1)
+    channel_invite(user_1["token"], channel_2, user_2["u_id"])
+    channel_ids = [c["channel_id"] for c in channels_list(user_2["token"])["channels"]]
+    assert channel_ids == [channel_1, channel_2]
+
+    channel_leave(user_2["token"], channel_1)
+    channel_ids = [c["channel_id"] for c in channels_list(user_2["token"])["channels"]]
+    assert channel_ids == [channel_2]
+    assert channels.user_channels[user_2["u_id"]] == {channel_2}
+
+def test_user_channels_cleared():
+    '''
+    Testing that clear resets the membership index.
+    '''
+    clear()
+    user_1 = auth_register("userone@gmail.com", "passwordOne", "Firstone", "Lastone")
+    channels_create(user_1["token"], "channel1", True)
+    assert channels.user_channels[user_1["u_id"]] == {1}
+
+    clear()
+    assert channels.user_channels == {}
+
 def test_list_both_private_public_channels():
     '''
     Testing when the user is in both public and private channels.
@@ -139,6 +172,72 @@ def test_valid_listall_channel():
     assert channel_list[3]["channel_id"] == channel4.get("channel_id")
     assert len(channel_list) == 4
     
+def test_listall_snapshot():
+    '''
+    Testing that listall reuses its list, adding new channels to it rather than rebuilding it.
+    '''
+    clear()
+    user_1 = auth_register("userone@gmail.com", "passwordOne", "Firstone", "Lastone")
+    channels_create(user_1["token"], "channel1", True)
+
+    first = channels_listall(user_1["token"])["channels"]
+    public = channels_listall(user_1["token"], public_only=True)["channels"]
+    assert channels_listall(user_1["token"])["channels"] is first
+
+    channels_create(user_1["token"], "channel2", True)
+    channels_create(user_1["token"], "channel3", False)
+    assert channels_listall(user_1["token"])["channels"] is first
+    assert first == [{"channel_id": 1, "name": "channel1"}, {"channel_id": 2, "name": "channel2"},
+                     {"channel_id": 3, "name": "channel3"}]
+    assert channels_listall(user_1["token"], public_only=True)["channels"] is public
+    assert public == [{"channel_id": 1, "name": "channel1"}, {"channel_id": 2, "name": "channel2"}]
+
+def test_listall_paginated():
+    '''
+    Testing that listall pages follow each other with end -1 on the last page.
+    '''
+    clear()
+    user_1 = auth_register("userone@gmail.com", "passwordOne", "Firstone", "Lastone")
+    for counter in range(5):
+        channels_create(user_1["token"], f"channel{counter}", True)
+
+    page = channels_listall(user_1["token"], 0, 2)
+    assert [c["channel_id"] for c in page["channels"]] == [1, 2]
+    assert page["end"] == 2
+    page = channels_listall(user_1["token"], page["end"], 2)
+    assert [c["channel_id"] for c in page["channels"]] == [3, 4]
+    page = channels_listall(user_1["token"], page["end"], 2)
+    assert [c["channel_id"] for c in page["channels"]] == [5]
+    assert page["end"] == -1
+
+    with pytest.raises(error.InputError):
+        channels_listall(user_1["token"], 0, 0)
+    with pytest.raises(error.InputError):
+        channels_listall(user_1["token"], -1, 2)
+
+def test_listall_filters():
+    '''
+    Testing the public only and name prefix filters.
+    '''
+    clear()
+    user_1 = auth_register("userone@gmail.com", "passwordOne", "Firstone", "Lastone")
+    channels_create(user_1["token"], "team-b", True)
+    channels_create(user_1["token"], "random", True)
+    channels_create(user_1["token"], "team-a", False)
+    channels_create(user_1["token"], "team-c", True)
+
+    public = channels_listall(user_1["token"], public_only=True)["channels"]
+    assert [c["name"] for c in public] == ["team-b", "random", "team-c"]
+
+    team = channels_listall(user_1["token"], name_prefix="team")["channels"]
+    assert [c["name"] for c in team] == ["team-a", "team-b", "team-c"]
+
+    public_team = channels_listall(user_1["token"], public_only=True, name_prefix="team")
+    assert [c["name"] for c in public_team["channels"]] == ["team-b", "team-c"]
+
+    assert channels_listall(user_1["token"], name_prefix="x")["channels"] == []
+    assert len(channels_listall(user_1["token"])["channels"]) == 4
+
 def test_channels_no_channels():
     '''
     Testing when there are no channels.
@@ -342,3 +441,25 @@ def test_invalid_create_private_token():
     invalid_user_token = 1
     with pytest.raises(error.InputError):
         channels_create(invalid_user_token, "channel_name", False)
+
+def test_listall_prefix_stops_after_page(monkeypatch):
+    '''
+    Testing that a paged prefix search doesn't build entries past the page it returns.
+    '''
+    clear()
+    user_1 = auth_register("userone@gmail.com", "passwordOne", "Firstone", "Lastone")
+    for counter in range(10):
+        channels_create(user_1["token"], f"channel{counter}", True)
+
+    built = []
+    listing_entry = channels.listing_entry
+    monkeypatch.setattr(channels, 'listing_entry', lambda channel: built.append(channel) or listing_entry(channel))
+
+    page = channels_listall(user_1["token"], 2, 3, name_prefix="chan")
+    assert [channel['name'] for channel in page['channels']] == ["channel2", "channel3", "channel4"]
+    assert page['end'] == 5
+    assert len(built) == 6
+
+    page = channels_listall(user_1["token"], 8, 3, name_prefix="chan")
+    assert [channel['name'] for channel in page['channels']] == ["channel8", "channel9"]
+    assert page['end'] == -1
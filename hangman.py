@@ -44,25 +44,13 @@ def helper_token_valid(token): #pragma: no cover
     '''
     Check token valid
     '''
-    token_invalid = True
-    for user in auth.registered_tokens:
-        if user.get('token') == token:
-            token_invalid = False 
-            break 
-
-    return token_invalid
+    return token not in auth.registered_tokens
 
 def helper_channel_valid(channel_id): #pragma: no cover
     '''
     Check channel_id valid
     '''
-    channel_invalid = True 
-    for channel in channels.channel_data:
-        if channel['channel_id'] == channel_id:
-            channel_invalid = False 
-            break 
-
-    return channel_invalid
+    return channel_id not in channels.channel_data
 
 def register_bot(): #pragma: no cover
     """
@@ -76,26 +64,15 @@ def register_bot(): #pragma: no cover
             'handle': "hangmanbot",
             'profile_img_url': profile_img_url
             }
-    user2 = {'u_id': -1,
-             'token': BOT_TOKEN
-    }
-    auth.registered_users.append(user)
-    auth.registered_tokens.append(user2)
+    auth.add_user(user)
+    auth.session_add(BOT_TOKEN, -1)
             
 def calling_bot_to_channel(channel_id): #pragma: no cover
-    not_in_channel = True
-    for user in auth.registered_tokens:
-        if user.get('u_id') == -1:
-            not_in_channel = False 
-            break 
-    if not_in_channel:
+    if -1 not in auth.user_tokens:
         register_bot()
 
-    for channel_ids in channels.channel_data:
-        if channel_id == channel_ids['channel_id']:
-            for ids in channel_ids['member_ids']:
-                if ids != -1:
-                    channel.channel_join(BOT_TOKEN, channel_id)
+    if -1 not in channels.channel_data[channel_id]['member_ids']:
+        channel.channel_join(BOT_TOKEN, channel_id)
 
 def start_hangman(token, channel_id): #pragma: no cover
     """
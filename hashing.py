@@ -0,0 +1,168 @@
+'''
+Hashing runs password hashing in a process pool so an expensive KDF
+doesn't hold the request thread or the GIL.
+'''
+import os
+import hmac
+import hashlib
+import secrets
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# Algorithm for new hashes, 'pbkdf2_sha256' or 'sha256'
+ALGORITHM = 'pbkdf2_sha256'
+ITERATIONS = 100000
+
+# Processes in the pool
+WORKERS = os.cpu_count() or 1
+# Forking a process that already runs the server's threads can copy held locks,
+# so workers are started from a clean process instead
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+# Most hashes queued or running at once, callers wait for a free slot
+MAX_PENDING = 64
+
+POOL = {'executor': None, 'slots': None}
+POOL_LOCK = threading.Lock()
+
+# Queue depth and counts of hashes done
+METRICS = {'pending': 0, 'max_pending': 0, 'completed': 0, 'upgraded': 0}
+METRICS_LOCK = threading.Lock()
+
+
+def compute_hash(algorithm, password, salt, iterations):
+    '''
+    Hash a password, runs inside a pool process.
+    '''
+    if algorithm == 'sha256':
+        # Legacy format, a bare hex digest with no salt
+        return hashlib.sha256(password.encode()).hexdigest()
+
+    if algorithm == 'pbkdf2_sha256':
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), iterations)
+        return f"pbkdf2_sha256${iterations}${salt}${digest.hex()}"
+
+    raise ValueError(f"Unknown hashing algorithm {algorithm}")
+
+
+def helper_parse(stored):
+    '''
+    Split a stored hash into (algorithm, salt, iterations).
+    '''
+    if '$' not in stored:
+        return 'sha256', '', 0
+
+    algorithm, iterations, salt, _ = stored.split('$')
+    return algorithm, salt, int(iterations)
+
+
+def helper_pool():
+    '''
+    Start the pool on first use, returns the executor and its slots.
+    '''
+    with POOL_LOCK:
+        if POOL['executor'] is None:
+            POOL['executor'] = ProcessPoolExecutor(
+                max_workers=WORKERS, mp_context=multiprocessing.get_context(START_METHOD))
+            POOL['slots'] = threading.BoundedSemaphore(MAX_PENDING)
+        return POOL['executor'], POOL['slots']
+
+
+def helper_start(algorithm, password, salt, iterations):
+    '''
+    Queue compute_hash in the pool once one of the MAX_PENDING slots is free,
+    returns its future. The slot is freed when the hash is done.
+    '''
+    executor, slots = helper_pool()
+
+    slots.acquire()
+    with METRICS_LOCK:
+        METRICS['pending'] += 1
+        METRICS['max_pending'] = max(METRICS['max_pending'], METRICS['pending'])
+
+    try:
+        future = executor.submit(compute_hash, algorithm, password, salt, iterations)
+    except Exception:
+        helper_finished(slots)
+        raise
+    future.add_done_callback(lambda _: helper_finished(slots))
+    return future
+
+
+def helper_finished(slots):
+    '''
+    Count a hash as done and free its slot.
+    '''
+    with METRICS_LOCK:
+        METRICS['pending'] -= 1
+        METRICS['completed'] += 1
+    slots.release()
+
+
+def helper_submit(algorithm, password, salt, iterations):
+    '''
+    Run compute_hash in the pool and wait for it, respecting MAX_PENDING.
+    '''
+    # Legacy hashes are a single digest, cheaper than a trip to the pool
+    if algorithm == 'sha256':
+        return compute_hash(algorithm, password, salt, iterations)
+    return helper_start(algorithm, password, salt, iterations).result()
+
+
+def hash_password(password):
+    '''
+    Hash a new password with the configured algorithm.
+    '''
+    return helper_submit(ALGORITHM, password, secrets.token_hex(16), ITERATIONS)
+
+
+def hash_passwords(passwords):
+    '''
+    Hash many new passwords at once, spread over the pool. Each takes a
+    slot like any other hash, so a big batch can't crowd out logins.
+    '''
+    if ALGORITHM == 'sha256':
+        return [compute_hash(ALGORITHM, password, '', 0) for password in passwords]
+
+    futures = [helper_start(ALGORITHM, password, secrets.token_hex(16), ITERATIONS)
+               for password in passwords]
+    return [future.result() for future in futures]
+
+
+def upgrade_password(password):
+    '''
+    Rehash a password whose stored hash is outdated, counted in METRICS.
+    '''
+    new_hash = hash_password(password)
+    with METRICS_LOCK:
+        METRICS['upgraded'] += 1
+    return new_hash
+
+
+def verify_password(password, stored):
+    '''
+    Return True if password matches the stored hash.
+    '''
+    if not stored:
+        return False
+
+    algorithm, salt, iterations = helper_parse(stored)
+    return hmac.compare_digest(helper_submit(algorithm, password, salt, iterations), stored)
+
+
+def needs_rehash(stored):
+    '''
+    Return True if the stored hash wasn't made with the current settings.
+    '''
+    algorithm, _, iterations = helper_parse(stored)
+    if algorithm != ALGORITHM:
+        return True
+    return algorithm == 'pbkdf2_sha256' and iterations != ITERATIONS
+
+
+def metrics():
+    '''
+    Return a snapshot of the queue depth and counts.
+    '''
+    with METRICS_LOCK:
+        return dict(METRICS)
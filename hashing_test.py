@@ -0,0 +1,119 @@
+'''
+Imported files for hashing_test.
+'''
+import hashlib
+import pytest
+import auth
+import error
+import hashing
+from other import clear
+
+def test_hash_and_verify():
+    '''
+    Testing that a hashed password verifies and a wrong one doesn't.
+    '''
+    stored = hashing.hash_password("password")
+    assert stored.startswith("pbkdf2_sha256$")
+    assert hashing.verify_password("password", stored)
+    assert not hashing.verify_password("wrongpassword", stored)
+
+def test_hashes_salted():
+    '''
+    Testing that the same password hashes differently each time.
+    '''
+    assert hashing.hash_password("password") != hashing.hash_password("password")
+
+def test_verify_legacy_sha256():
+    '''
+    Testing that old unsalted sha256 hashes still verify.
+    '''
+    stored = hashlib.sha256("password".encode()).hexdigest()
+    assert hashing.verify_password("password", stored)
+    assert not hashing.verify_password("wrongpassword", stored)
+    assert hashing.needs_rehash(stored)
+
+def test_configurable_algorithm(monkeypatch):
+    '''
+    Testing that the algorithm and iterations used for new hashes can be changed.
+    '''
+    monkeypatch.setattr(hashing, 'ALGORITHM', 'sha256')
+    stored = hashing.hash_password("password")
+    assert stored == hashlib.sha256("password".encode()).hexdigest()
+    assert not hashing.needs_rehash(stored)
+
+    monkeypatch.setattr(hashing, 'ALGORITHM', 'pbkdf2_sha256')
+    monkeypatch.setattr(hashing, 'ITERATIONS', 1000)
+    stored = hashing.hash_password("password")
+    assert stored.startswith("pbkdf2_sha256$1000$")
+
+    monkeypatch.setattr(hashing, 'ITERATIONS', 2000)
+    assert hashing.needs_rehash(stored)
+
+def test_login_upgrades_sha256():
+    '''
+    Testing that a sha256 hash is upgraded on the user's next login.
+    '''
+    clear()
+    current_user = auth.auth_register("test@gmail.com", "password", "Firstname", "Lastname")
+    auth.auth_logout(current_user.get("token"))
+    user = auth.registered_users[current_user.get("u_id")]
+    user['password'] = hashlib.sha256("password".encode()).hexdigest()
+
+    upgraded = hashing.metrics()['upgraded']
+    auth.auth_login("test@gmail.com", "password")
+    assert user['password'].startswith("pbkdf2_sha256$")
+    assert hashing.metrics()['upgraded'] == upgraded + 1
+
+def test_login_wrong_password_not_upgraded():
+    '''
+    Testing that a failed login leaves the old hash alone.
+    '''
+    clear()
+    current_user = auth.auth_register("test@gmail.com", "password", "Firstname", "Lastname")
+    auth.auth_logout(current_user.get("token"))
+    user = auth.registered_users[current_user.get("u_id")]
+    legacy = hashlib.sha256("password".encode()).hexdigest()
+    user['password'] = legacy
+
+    with pytest.raises(error.InputError):
+        auth.auth_login("test@gmail.com", "wrongpassword")
+    assert user['password'] == legacy
+
+def test_metrics():
+    '''
+    Testing that queue depth is back to zero and completed counts go up.
+    '''
+    completed = hashing.metrics()['completed']
+    hashing.hash_password("password")
+    metrics = hashing.metrics()
+    assert metrics['completed'] == completed + 1
+    assert metrics['pending'] == 0
+    assert metrics['max_pending'] >= 1
+
+def test_bulk_hashing_respects_max_pending(monkeypatch):
+    '''
+    Testing that a bulk batch never has more than MAX_PENDING hashes queued at once.
+    '''
+    hashing.helper_pool()
+    monkeypatch.setitem(hashing.POOL, 'slots', hashing.threading.BoundedSemaphore(2))
+    monkeypatch.setitem(hashing.METRICS, 'max_pending', 0)
+    monkeypatch.setattr(hashing, 'ITERATIONS', 1000)
+
+    passwords = [f"password{counter}" for counter in range(8)]
+    hashes = hashing.hash_passwords(passwords)
+
+    assert [hashing.verify_password(password, stored) for password, stored in zip(passwords, hashes)] == [True] * 8
+    assert hashing.metrics()['max_pending'] <= 2
+    assert hashing.metrics()['pending'] == 0
+
+def test_legacy_sha256_inline(monkeypatch):
+    '''
+    Testing that legacy sha256 hashes are checked without the pool.
+    '''
+    def no_pool():
+        raise AssertionError("sha256 shouldn't use the pool")
+    monkeypatch.setattr(hashing, 'helper_pool', no_pool)
+    legacy = hashlib.sha256("password".encode()).hexdigest()
+
+    assert hashing.verify_password("password", legacy)
+    assert not hashing.verify_password("wrong", legacy)
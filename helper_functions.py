@@ -2,67 +2,108 @@
 File with helper functions to help with code
 '''
 
+import threading
 import auth
 import channels 
 
+# Auth contexts resolved during the current request, {token: context}
+REQUEST_CONTEXTS = threading.local()
+
 def check_token(token):
     '''
     Returns dictionary with u_id and status of token
     '''
     #If token valid
-    token_status = True 
-    for user in auth.registered_tokens:
-        if user.get('token') == token:
-            token_status = False
-            u_id = user.get('u_id')
-            return {'token_status': token_status, 'u_id': u_id}
+    if auth.TOKEN_VALIDATION == 'jwt':
+        u_id = auth.decode_token(token)
+    else:
+        u_id = auth.registered_tokens.get(token)
+    if u_id is not None:
+        return {'token_status': False, 'u_id': u_id}
     
-    return {'token_status': token_status, 'u_id': None}
+    return {'token_status': True, 'u_id': None}
+
+def begin_request():
+    '''
+    Start caching auth contexts for the request on this thread
+    '''
+    REQUEST_CONTEXTS.contexts = {}
+
+def end_request(exception=None):
+    '''
+    Stop caching auth contexts once the request is done
+    '''
+    REQUEST_CONTEXTS.contexts = None
+
+def auth_context(token):
+    '''
+    Returns dictionary with status of token, u_id and user record, resolved
+    once per request
+    '''
+    contexts = getattr(REQUEST_CONTEXTS, 'contexts', None)
+    if contexts is not None and token in contexts:
+        return contexts[token]
+
+    status = check_token(token)
+    context = {
+        'token_status': status['token_status'],
+        'u_id': status['u_id'],
+        'user': auth.registered_users.get(status['u_id']),
+    }
+
+    if contexts is not None:
+        contexts[token] = context
+    return context
+
+def format_message(msg, u_id):
+    '''
+    Return the message as shown to u_id
+    '''
+    reacts = []
+    for react_id, react in msg.get('reacts').items():
+        # Built once per change, not per message shown
+        if react['listing'] is None:
+            react['listing'] = list(react['u_ids'])
+        reacts.append({
+            'react_id': react_id,
+            'u_ids': react['listing'],
+            'is_this_user_reacted': u_id in react['u_ids'],
+        })
+
+    return {
+        'message_id': msg.get('message_id'),
+        'u_id': msg.get('user_id'),
+        'message': msg.get('message_sent'),
+        'time_created': msg.get('time_created'),
+        'reacts': reacts,
+        'is_pinned': msg.get('is_pinned'),
+    }
 
 def check_channelid_valid(channel_id):
     '''
     Return booleon on channel_id being valid or not
     '''
-    #Checked invalid channel
-    for curr_channels in channels.channel_data:
-        if curr_channels.get('channel_id') == channel_id:
-            return False 
-
-    return True
+    return channel_id not in channels.channel_data
 
 def check_uid_valid(u_id):
     '''
     Return booleon on u_id being valid or not
     '''
-    for user in auth.registered_users: 
-        if user.get('u_id') == u_id:
-            return  False
-    
-    return True
+    return u_id not in auth.registered_users
 
 def check_uid_owner_in_channel(u_id, channel_id):
     '''
     Return booelon on u_id is owner or not
     '''
-    for user in channels.channel_data:
-        if user.get("channel_id") == channel_id:
-            for owner in user.get("owner_ids"):
-                if owner == u_id:
-                    return False 
-
-    return True
+    channel = channels.channel_data.get(channel_id)
+    return channel is None or u_id not in channel['owner_ids']
 
 def check_u_id_in_channel(u_id, channel_id):
     '''
     Return booelon on u_id is member or not
     '''
-    for user in channels.channel_data:
-        if user.get("channel_id") == channel_id:
-            for owner in user.get("member_ids"):
-                if owner == u_id:
-                    return False 
-
-    return True
+    channel = channels.channel_data.get(channel_id)
+    return channel is None or u_id not in channel['member_ids']
 
 
 
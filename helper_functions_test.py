@@ -0,0 +1,90 @@
+'''
+Imported files for helper_functions_test.
+'''
+import auth
+import channel
+import channels
+import helper_functions
+from other import clear
+
+def test_auth_context():
+    '''
+    Testing that auth_context resolves the token to its u_id and user record.
+    '''
+    clear()
+    current_user = auth.auth_register("test@gmail.com", "password", "Firstname", "Lastname")
+    context = helper_functions.auth_context(current_user.get('token'))
+
+    assert context.get('token_status') == False
+    assert context.get('u_id') == current_user.get('u_id')
+    assert context.get('user') is auth.registered_users[current_user.get('u_id')]
+
+def test_auth_context_invalid_token():
+    '''
+    Testing that an invalid token has no u_id or user.
+    '''
+    clear()
+    context = helper_functions.auth_context('invalid_token')
+    assert context == {'token_status': True, 'u_id': None, 'user': None}
+
+def test_auth_context_cached_in_request(monkeypatch):
+    '''
+    Testing that a token is only resolved once during a request.
+    '''
+    clear()
+    current_user = auth.auth_register("test@gmail.com", "password", "Firstname", "Lastname")
+    calls = []
+    check_token = helper_functions.check_token
+    monkeypatch.setattr(helper_functions, 'check_token', lambda token: calls.append(token) or check_token(token))
+
+    helper_functions.begin_request()
+    try:
+        first = helper_functions.auth_context(current_user.get('token'))
+        second = helper_functions.auth_context(current_user.get('token'))
+    finally:
+        helper_functions.end_request()
+
+    assert first is second
+    assert len(calls) == 1
+
+def test_auth_context_not_cached_outside_request():
+    '''
+    Testing that a logout is seen straight away outside of a request.
+    '''
+    clear()
+    current_user = auth.auth_register("test@gmail.com", "password", "Firstname", "Lastname")
+    assert helper_functions.auth_context(current_user.get('token')).get('token_status') == False
+
+    auth.auth_logout(current_user.get('token'))
+    assert helper_functions.auth_context(current_user.get('token')).get('token_status') == True
+
+def test_channel_checks():
+    '''
+    Testing the channel, member and owner checks against the channel store.
+    '''
+    clear()
+    owner = auth.auth_register("owner@gmail.com", "password", "Owner", "Lastname")
+    member = auth.auth_register("member@gmail.com", "password", "Member", "Lastname")
+    channel_id = channels.channels_create(owner.get('token'), "channel", True)['channel_id']
+    channel.channel_join(member.get('token'), channel_id)
+
+    assert helper_functions.check_channelid_valid(channel_id) == False
+    assert helper_functions.check_channelid_valid(channel_id + 1) == True
+    assert helper_functions.check_u_id_in_channel(member.get('u_id'), channel_id) == False
+    assert helper_functions.check_uid_owner_in_channel(member.get('u_id'), channel_id) == True
+    assert helper_functions.check_uid_owner_in_channel(owner.get('u_id'), channel_id) == False
+    assert helper_functions.check_u_id_in_channel(member.get('u_id'), channel_id + 1) == True
+
+def test_members_keep_join_order():
+    '''
+    Testing that channel_details lists members in the order they joined.
+    '''
+    clear()
+    users = [auth.auth_register(f"user{i}@gmail.com", "password", "First", "Last")
+             for i in range(5)]
+    channel_id = channels.channels_create(users[3].get('token'), "channel", True)['channel_id']
+    for i in (1, 4, 0, 2):
+        channel.channel_join(users[i].get('token'), channel_id)
+
+    details = channel.channel_details(users[3].get('token'), channel_id)
+    assert [member['u_id'] for member in details['all_members']] == [3, 1, 4, 0, 2]
@@ -1,17 +1,27 @@
 '''
 Imported files for message.
 '''
-import time
 from datetime import datetime
+import heapq
 import auth
 import error 
 import channels
 import hangman
 import helper_functions
+import scheduler
 
 # list of generated message ids:
 message_ids = []
 
+# Messages waiting to be sent by message_sendlater, or that failed to send
+# {message_id: {'job_id', 'u_id', 'channel_id', 'message', 'time_sent', 'status', 'error'}}
+scheduled_messages = {}
+# {u_id or channel_id: {'heap': [(time_sent, message_id)], 'dead': entries no longer scheduled}}
+# Sent and cancelled messages are only dropped from scheduled_messages, their
+# heap entries are skipped and cleared out when the index is next listed.
+user_scheduled = {}
+channel_scheduled = {}
+
 
 def message_send(token, channel_id, message):
     '''
@@ -21,19 +31,14 @@ def message_send(token, channel_id, message):
         raise error.InputError("Messages can't have more than 1000 characters")
 
     #Check token valid
-    if helper_functions.check_token(token).get('token_status'):
+    auth_user = helper_functions.auth_context(token)
+    if auth_user.get('token_status'):
         raise error.AccessError(description="Token invalid")
 
-    user_id = helper_functions.check_token(token).get('u_id')
+    user_id = auth_user.get('u_id')
   
-    invalid_channel_id = True
-    not_in_channel = True
-    # Checking is the token exist then getting their u_id
-    for channel_datas in channels.channel_data:
-        if channel_datas.get("channel_id") == channel_id:
-            invalid_channel_id = False
-            if user_id in channel_datas['member_ids']:
-                not_in_channel = False
+    invalid_channel_id = helper_functions.check_channelid_valid(channel_id)
+    not_in_channel = helper_functions.check_u_id_in_channel(user_id, channel_id)
 
     # If token is invalid return an error
     if invalid_channel_id:
@@ -43,35 +48,16 @@ def message_send(token, channel_id, message):
         raise error.AccessError("You are not in this channel.")
     
     time_create_date = datetime.now().replace(microsecond=0)
-    time_create = time_create_date.timestamp()
+    time_created = time_create_date.timestamp()
 
     # Generate message ID
-    gen_id = len(message_ids) + 1
+    gen_id = helper_new_message_id()
     message_id = {
         'message_id': gen_id,
     }
 
-    react_info = [{
-        'react_id': 1,
-        'u_ids': [],
-    }]
-
-    msg = {
-        'message_sent': message,
-        'message_id': gen_id,
-        'user_id': user_id,
-        'time_created': time_create,
-        'reacts': react_info,
-        'is_pinned': False
-    }
+    helper_post_message(user_id, channel_id, message, gen_id, time_created)
 
-    message_ids.append(message_id)
-
-    for channels_data in channels.channel_data:
-        if channels_data.get('channel_id') == channel_id:
-            channels_data['messages'].append(msg)
-
-    
     # Hang man option
     if "/hangman" in message:
         hangman.start_hangman(token, channel_id)
@@ -85,44 +71,90 @@ def message_send(token, channel_id, message):
 
     return message_id
 
+def helper_deliver(user_id, channel_id, message, message_id=None, time_created=None):
+    '''
+    Send a message for user_id without a token, for work scheduled earlier
+    whose token may have gone. Chat commands like /hangman aren't run.
+    Returns the message_id.
+    '''
+    if helper_functions.check_channelid_valid(channel_id):
+        raise error.AccessError("The channel no longer exists.")
+    if helper_functions.check_u_id_in_channel(user_id, channel_id):
+        raise error.AccessError("The sender is no longer in this channel.")
+
+    if time_created is None:
+        time_created = datetime.now().replace(microsecond=0).timestamp()
+    if message_id is None:
+        message_id = helper_new_message_id()
+
+    helper_post_message(user_id, channel_id, message, message_id, time_created)
+    return message_id
+
+def helper_post_message(user_id, channel_id, message, message_id, time_created):
+    '''
+    Add a message from user_id to the channel, the caller has checked they can send it.
+    '''
+    # Every message shows react 1, even before anyone uses it
+    react_info = {1: helper_new_react()}
+
+    msg = {
+        'message_sent': message,
+        'message_id': message_id,
+        'user_id': user_id,
+        'time_created': time_created,
+        'reacts': react_info,
+        'is_pinned': False
+    }
+
+    channels.add_message(channels.channel_data[channel_id], msg)
+
+def helper_new_react():
+    '''
+    Return an empty react: the users who reacted, in order, and the
+    list of them shown in messages, built when first asked for.
+    '''
+    return {'u_ids': {}, 'listing': None}
+
+def helper_new_message_id():
+    '''
+    Allocate the next message id.
+    '''
+    gen_id = len(message_ids) + 1
+    message_ids.append({'message_id': gen_id})
+    return gen_id
+
+def helper_reserve_message_id(message_id):
+    '''
+    Move the allocator past a message id given out before a restart.
+    '''
+    while len(message_ids) < message_id:
+        message_ids.append({'message_id': len(message_ids) + 1})
+
 def message_remove(token, message_id):
     '''
     Removing a message that is requested by the user.
     '''
     #If token invalid
-    if helper_functions.check_token(token).get('token_status'):
+    auth_user = helper_functions.auth_context(token)
+    if auth_user.get('token_status'):
         raise error.AccessError(description="Token invalid")
-    user_id = helper_functions.check_token(token).get('u_id')
+    user_id = auth_user.get('u_id')
 
     # Checking if message ID is valid
-    invalid_m_id = True
-    for data in channels.channel_data:
-        for msg in data['messages']:
-            if msg.get('message_id') == message_id:
-                channel_id = data.get('channel_id')
-                invalid_m_id = False
-                break
-
-    if invalid_m_id:
+    data, message_data = channels.locate_message(message_id)
+    if message_data is None:
         raise error.InputError("You have entered an invalid message ID")
     
-    
     #Check if message is from the authorised user
-    # Go inside message to check if message_id is the same in order to remove the message
+    if helper_functions.check_uid_owner_in_channel(user_id, data.get('channel_id')):
+        if message_data.get('user_id') != user_id:
+            raise error.AccessError("Not an owner or not user who sent msg")
+
     # Return error if message no longer existing
-    for data in channels.channel_data:
-        for message_data in data.get('messages'):
-            if message_data.get('message_id') == message_id:
-                #check if owner
-                if helper_functions.check_uid_owner_in_channel(user_id, channel_id):
-                        if message_data.get('user_id') != user_id:
-                            raise error.AccessError("Not an owner or not user who sent msg")
-
-                if msg['message_sent'] == None: 
-                    raise error.InputError("Message no longer exists")
-                else:
-                    data.get('messages').remove(message_data)
-                break
+    if message_data['message_sent'] == None: 
+        raise error.InputError("Message no longer exists")
+
+    channels.remove_message(data, message_id)
     return {}
 
 def message_edit(token, message_id, message):
@@ -130,39 +162,27 @@ def message_edit(token, message_id, message):
     Given a message id and user token edit the message.
     '''
     #Token invalid check
-    if helper_functions.check_token(token).get('token_status'):
+    auth_user = helper_functions.auth_context(token)
+    if auth_user.get('token_status'):
         raise error.AccessError(description="Token invalid")
-    user_id = helper_functions.check_token(token).get('u_id')
+    user_id = auth_user.get('u_id')
 
     # Error message too long
     if len(message) > 1000:
         raise error.InputError("You have message longer than 1000 words")
 
-    invalid_messages_id = True
-
     # Testing if the message id is valid
-    for data in channels.channel_data:
-        for msg in data['messages']:
-            if msg.get('message_id') == message_id:
-                channel_id = data.get("channel_id")
-                invalid_messages_id = False
-    
-    # Raising the error
-    if invalid_messages_id:
+    data, message_data = channels.locate_message(message_id)
+    if message_data is None:
         raise error.InputError("You have entered an invalid message id")
 
+    #check if owner
+    if helper_functions.check_uid_owner_in_channel(user_id, data.get("channel_id")):
+        if message_data.get('user_id') != user_id:
+            raise error.AccessError("Not an owner or not user who sent msg")
 
     # Editing the message
-    for data in channels.channel_data:
-        for message_data in data.get('messages'):
-            if message_data.get("message_id") == message_id:
-                #check if owner
-                if helper_functions.check_uid_owner_in_channel(user_id, channel_id):
-                        if message_data.get('user_id') != user_id:
-                            raise error.AccessError("Not an owner or not user who sent msg")
-                    
-                message_data['message_sent'] = message
-                break
+    message_data['message_sent'] = message
     return {}
 
 def message_sendlater(token, channel_id, message, time_sent):
@@ -170,23 +190,18 @@ def message_sendlater(token, channel_id, message, time_sent):
     Given a message and user token send the message later.
     '''
     #Token invalid test
-    if helper_functions.check_token(token).get('token_status'):
+    auth_user = helper_functions.auth_context(token)
+    if auth_user.get('token_status'):
         raise error.AccessError(description="Token invalid")
-    user_id = helper_functions.check_token(token).get('u_id')
+    user_id = auth_user.get('u_id')
     if len(message) > 1000:
         raise error.InputError("You have message longer than 1000 words")
 
     if message == '':
         raise error.InputError("no messages")
     
-    invalid_channel_id = True
-    not_in_channel = True
-    # Checking is the token exist then getting their u_id
-    for channel_datas in channels.channel_data:
-        if channel_datas.get("channel_id") == channel_id:
-            invalid_channel_id = False
-            if user_id in channel_datas['member_ids']:
-                not_in_channel = False
+    invalid_channel_id = helper_functions.check_channelid_valid(channel_id)
+    not_in_channel = helper_functions.check_u_id_in_channel(user_id, channel_id)
 
     if invalid_channel_id:
         raise error.InputError("You have entered an invalid channel id.")
@@ -199,10 +214,132 @@ def message_sendlater(token, channel_id, message, time_sent):
      
     if time_sent < time_create:
         raise error.InputError("Can not send message to that time.")
-    time_to_be_sent = time_sent - time_create
-    time.sleep(time_to_be_sent) 
-    
-    return message_send(token, channel_id, message)
+
+    # Give out the id now, the scheduler sends the message at time_sent
+    gen_id = helper_new_message_id()
+    # Journal the sender's u_id, never their token
+    job_id = scheduler.schedule(time_sent, 'message_sendlater', user_id, channel_id, message, gen_id)
+    helper_restore_scheduled(job_id, time_sent, user_id, channel_id, message, gen_id)
+
+    return {'message_id': gen_id}
+
+def message_scheduled_list(token, channel_id=None):
+    '''
+    List the user's messages waiting to be sent, soonest first. Given a
+    channel_id, list every member's scheduled messages in that channel instead.
+    Messages that couldn't be sent stay listed with status 'failed' until cancelled.
+    '''
+    auth_user = helper_functions.auth_context(token)
+    if auth_user.get('token_status'):
+        raise error.AccessError(description="Token invalid")
+    user_id = auth_user.get('u_id')
+
+    if channel_id is None:
+        index = user_scheduled.get(user_id)
+    else:
+        if helper_functions.check_channelid_valid(channel_id):
+            raise error.InputError("You have entered an invalid channel id.")
+        if helper_functions.check_u_id_in_channel(user_id, channel_id):
+            raise error.AccessError("You are not in this channel.")
+        index = channel_scheduled.get(channel_id)
+
+    scheduled = []
+    for _, message_id in helper_live_scheduled(index):
+        entry = scheduled_messages[message_id]
+        scheduled.append({
+            'message_id': message_id,
+            'u_id': entry['u_id'],
+            'channel_id': entry['channel_id'],
+            'message': entry['message'],
+            'time_sent': entry['time_sent'],
+            'status': entry['status'],
+            'error': entry['error'],
+        })
+    return {'messages': scheduled}
+
+def message_scheduled_cancel(token, message_id):
+    '''
+    Cancel a message the user scheduled with message_sendlater, or dismiss one that failed.
+    '''
+    auth_user = helper_functions.auth_context(token)
+    if auth_user.get('token_status'):
+        raise error.AccessError(description="Token invalid")
+    user_id = auth_user.get('u_id')
+
+    entry = scheduled_messages.get(message_id)
+    if entry is None:
+        raise error.InputError("That message isn't scheduled to be sent")
+    if entry['u_id'] != user_id:
+        raise error.AccessError("You didn't schedule this message")
+
+    # The dispatcher may have started sending it already
+    if entry['status'] == 'pending' and not scheduler.cancel(entry['job_id']):
+        raise error.InputError("That message is already being sent")
+
+    helper_unschedule(message_id)
+    return {}
+
+def helper_send_scheduled(u_id, channel_id, message, message_id):
+    '''
+    Send a message scheduled by message_sendlater, once its time comes.
+    '''
+    entry = scheduled_messages[message_id]
+    try:
+        helper_deliver(u_id, channel_id, message, message_id, entry['time_sent'])
+    except (error.AccessError, error.InputError) as err:
+        # e.g. the sender left the channel, keep it listed so they can see why
+        entry['status'] = 'failed'
+        entry['error'] = err.description
+        return
+    helper_unschedule(message_id)
+
+def helper_restore_scheduled(job_id, time_sent, u_id, channel_id, message, message_id):
+    '''
+    Add a scheduled message to the user and channel indexes, keeping its id reserved.
+    '''
+    helper_reserve_message_id(message_id)
+    scheduled_messages[message_id] = {
+        'job_id': job_id,
+        'u_id': u_id,
+        'channel_id': channel_id,
+        'message': message,
+        'time_sent': time_sent,
+        'status': 'pending',
+        'error': None,
+    }
+    for index, key in ((user_scheduled, u_id), (channel_scheduled, channel_id)):
+        entries = index.setdefault(key, {'heap': [], 'dead': 0})
+        heapq.heappush(entries['heap'], (time_sent, message_id))
+
+def helper_unschedule(message_id):
+    '''
+    Drop a message that was sent or cancelled, leaving its index entries to be cleared lazily.
+    '''
+    entry = scheduled_messages.pop(message_id)
+    user_scheduled[entry['u_id']]['dead'] += 1
+    channel_scheduled[entry['channel_id']]['dead'] += 1
+
+def helper_live_scheduled(index):
+    '''
+    Return the (time_sent, message_id) entries of an index still scheduled,
+    soonest first, clearing out the ones that aren't.
+    '''
+    if index is None:
+        return []
+
+    heap = index['heap']
+    # Sent messages are usually the soonest, so they come off the top
+    while heap and heap[0][1] not in scheduled_messages:
+        heapq.heappop(heap)
+        index['dead'] -= 1
+
+    # Rebuild once most of what's left is cancelled
+    if index['dead'] > len(heap) // 2:
+        heap[:] = [item for item in heap if item[1] in scheduled_messages]
+        heapq.heapify(heap)
+        index['dead'] = 0
+
+    return sorted(item for item in heap if item[1] in scheduled_messages)
     
 def message_react(token, message_id, react_id):
     '''
@@ -211,45 +348,25 @@ def message_react(token, message_id, react_id):
     # Takes in react_id as a param --> need to be generated when the message is sent
 
     # Checking if token is valid
-    if helper_functions.check_token(token).get('token_status'):
+    auth_user = helper_functions.auth_context(token)
+    if auth_user.get('token_status'):
         raise error.AccessError(description="Token invalid")
-    user_id = helper_functions.check_token(token).get('u_id')
+    user_id = auth_user.get('u_id')
 
     # Checking if message ID is valid
-    invalid_m_id = True
-    for data in channels.channel_data:
-        for msg in data['messages']:
-            if msg.get('message_id') == message_id:
-                #channel_id = data.get('channel_id')
-                invalid_m_id = False
-                break
-        
-    if invalid_m_id:
+    _, message_data = channels.locate_message(message_id)
+    if message_data is None:
         raise error.InputError('You have entered an invalid message ID')
     
-    for user in auth.registered_tokens:
-        if user.get("token") == token:
-            user_id = user.get('u_id')
-            break
-
-    already_reacted = True
-
-    if react_id != 1:
+    if react_id < 1:
         raise error.InputError('Invalid react_id entered')
 
-    for data in channels.channel_data:
-        for message_data in data.get('messages'):
-            if message_id == message_data.get('message_id'):
-                for react_data in message_data.get('reacts'):
-                    if react_id == 1:
-                        if user_id not in react_data['u_ids']:
-                            react_data['u_ids'].append(user_id) 
-                            already_reacted = False 
-                            break
-                          
-    if already_reacted:
+    react_data = message_data['reacts'].setdefault(react_id, helper_new_react())
+    if user_id in react_data['u_ids']:
         raise error.InputError('You have already reacted to this message')
 
+    react_data['u_ids'][user_id] = None
+    react_data['listing'] = None
     return {}
 
 def message_unreact(token, message_id, react_id):
@@ -257,45 +374,25 @@ def message_unreact(token, message_id, react_id):
     Given a message, allow the user to unreact.
     '''
     # Checking if token is valid
-    if helper_functions.check_token(token).get('token_status'):
+    auth_user = helper_functions.auth_context(token)
+    if auth_user.get('token_status'):
         raise error.AccessError(description="Token invalid")
-    user_id = helper_functions.check_token(token).get('u_id')
+    user_id = auth_user.get('u_id')
 
     # Checking if message ID is valid
-    invalid_m_id = True
-    for data in channels.channel_data:
-        for msg in data['messages']:
-            if msg.get('message_id') == message_id:
-                #channel_id = data.get('channel_id')
-                invalid_m_id = False
-                break
-        
-    if invalid_m_id:
+    _, message_data = channels.locate_message(message_id)
+    if message_data is None:
         raise error.InputError('You have entered an invalid message ID')
 
-    for user in auth.registered_tokens:
-        if user.get("token") == token:
-            user_id = user.get('u_id')
-            break
-
-    already_unreacted = True
-
-    if react_id != 1:
-        raise error.InputError('Invalid react_id entered')
-
-    for data in channels.channel_data:
-        for message_data in data.get('messages'):
-            if message_id == message_data.get('message_id'):
-                for react_data in message_data.get('reacts'):
-                    if react_id == 1:
-                        if user_id in react_data['u_ids']:
-                            react_data['u_ids'].remove(user_id) 
-                            already_unreacted = False 
-                            break
-                
-    if already_unreacted:
+    react_data = message_data['reacts'].get(react_id)
+    if react_data is None or user_id not in react_data['u_ids']:
         raise error.InputError('You have already unreacted this message')
 
+    del react_data['u_ids'][user_id]
+    react_data['listing'] = None
+    # Only react 1 stays on the message once nobody is using it
+    if not react_data['u_ids'] and react_id != 1:
+        del message_data['reacts'][react_id]
     return {}
 
 def message_pin(token, message_id):
@@ -303,40 +400,25 @@ def message_pin(token, message_id):
     #   message_id invalid:
 
     #Invalid token test
-    if helper_functions.check_token(token).get('token_status'):
+    auth_user = helper_functions.auth_context(token)
+    if auth_user.get('token_status'):
         raise error.AccessError(description="Token invalid")
 
-    user_id = helper_functions.check_token(token).get('u_id')
-
-    channel_id = ""
-    invalid_msg_id = True
-    for data in channels.channel_data:
-        for msg in data['messages']:
-            if msg.get('message_id') == message_id:
-                channel_id = int(data.get('channel_id'))
-                invalid_msg_id = False
-                break
+    user_id = auth_user.get('u_id')
 
-    if invalid_msg_id == True:
+    data, message_data = channels.locate_message(message_id)
+    if message_data is None:
         raise error.InputError("You have entered an invalid message ID")
           
     #   not owner / flockr owner
     
-    for channel_datas in channels.channel_data:
-        if channel_datas.get("channel_id") == channel_id:
-            if user_id not in channel_datas['owner_ids']:
-                raise error.AccessError("You are not in this channel / not an owner")
-            else: 
-                 break
+    if helper_functions.check_uid_owner_in_channel(user_id, data.get('channel_id')):
+        raise error.AccessError("You are not in this channel / not an owner")
 
     # message already pinned? if not, pin.
-    for data in channels.channel_data:
-        for message_data in data.get('messages'):
-            if message_data.get("message_id") == message_id:
-                if message_data.get("is_pinned") == True:
-                    raise error.InputError("This message is already pinned")
-                else:
-                    message_data['is_pinned'] = True
+    if message_data.get("is_pinned") == True:
+        raise error.InputError("This message is already pinned")
+    message_data['is_pinned'] = True
           
     return {}   
 
@@ -345,47 +427,26 @@ def message_unpin(token, message_id):
     #   message_id invalid:
 
     #Invalid token test
-    if helper_functions.check_token(token).get('token_status'):
+    auth_user = helper_functions.auth_context(token)
+    if auth_user.get('token_status'):
         raise error.AccessError(description="Token invalid")
-    user_id = helper_functions.check_token(token).get('u_id')
-
-    channel_id = ""
-    invalid_msg_id = True
-    for data in channels.channel_data:
-        for msg in data['messages']:
-            if msg.get('message_id') == message_id:
-                channel_id = int(data.get('channel_id'))
-                invalid_msg_id = False
-                break
-
-    if invalid_msg_id:
+    user_id = auth_user.get('u_id')
+
+    data, message_data = channels.locate_message(message_id)
+    if message_data is None:
         raise error.InputError("You have entered an invalid message ID")
           
-    # check access error
-    #   not member of channel
-    user_id = ""
-    for user in auth.registered_tokens:
-        if user.get("token") == token:
-            user_id = int(user.get('u_id'))
-            break
-
     #   not owner / flockr owner
-    for channel_datas in channels.channel_data:
-        if channel_datas.get("channel_id") == channel_id:
-            if user_id not in channel_datas['owner_ids']:
-                raise error.AccessError("You are not in this channel / not an owner")
-            else: 
-                break
+    if helper_functions.check_uid_owner_in_channel(user_id, data.get('channel_id')):
+        raise error.AccessError("You are not in this channel / not an owner")
 
     # message already pinned? if not, pin.
-    for data in channels.channel_data:
-        for message_data in data.get('messages'):
-            if message_data.get("message_id") == message_id:
-                if message_data.get("is_pinned") == False:
-                    raise error.InputError("This message is already unpinned")
-                else:
-                    message_data['is_pinned'] = False
+    if message_data.get("is_pinned") == False:
+        raise error.InputError("This message is already unpinned")
+    message_data['is_pinned'] = False
           
     return {}
 
     
+
+scheduler.register('message_sendlater', helper_send_scheduled, helper_restore_scheduled)
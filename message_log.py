@@ -0,0 +1,157 @@
+'''
+Message log stores a channel's messages in fixed size segments, so appends,
+removes and page reads don't copy or shift the whole history.
+'''
+
+# Messages per segment
+SEGMENT_SIZE = 256
+# Compact once removed messages outnumber live ones and there are at least this many
+COMPACT_MIN_TOMBSTONES = 256
+
+
+def new_log():
+    '''
+    Return an empty log.
+    '''
+    return {
+        'segments': {}, # {segment number: [message or None once removed]}
+        'live_counts': {}, # {segment number: messages not removed}
+        'positions': {}, # {message_id: slot}, removed ones stay until compaction
+        'next_slot': 0,
+        'live': 0,
+        'tombstones': 0,
+    }
+
+
+def length(log):
+    '''
+    Return the number of messages in the log.
+    '''
+    return log['live']
+
+
+def append(log, msg):
+    '''
+    Add msg as the newest message, returns its slot.
+    '''
+    slot = log['next_slot']
+    segment_no = slot // SEGMENT_SIZE
+    log['segments'].setdefault(segment_no, []).append(msg)
+    log['live_counts'][segment_no] = log['live_counts'].get(segment_no, 0) + 1
+    log['positions'][msg['message_id']] = slot
+    log['next_slot'] += 1
+    log['live'] += 1
+    return slot
+
+
+def at(log, slot):
+    '''
+    Return the message in slot, None if it was removed.
+    '''
+    segment = log['segments'].get(slot // SEGMENT_SIZE, ())
+    offset = slot % SEGMENT_SIZE
+    return segment[offset] if offset < len(segment) else None
+
+
+def has_slot(log, message_id):
+    '''
+    Return True if message_id has a slot, removed messages keep theirs until
+    the log is compacted so older() can still start from them.
+    '''
+    return message_id in log['positions']
+
+
+def get(log, message_id):
+    '''
+    Return the message with message_id, or None if it isn't in the log.
+    '''
+    slot = log['positions'].get(message_id)
+    if slot is None:
+        return None
+    return at(log, slot)
+
+
+def remove(log, message_id):
+    '''
+    Replace the message with a tombstone, releasing its segment once every
+    message in a full segment is removed. Returns True if the log was
+    compacted, which moves every message to a new slot.
+    '''
+    slot = log['positions'][message_id]
+    if at(log, slot) is None:
+        raise KeyError(message_id)
+    segment_no = slot // SEGMENT_SIZE
+    segment = log['segments'][segment_no]
+    segment[slot % SEGMENT_SIZE] = None
+    log['live_counts'][segment_no] -= 1
+    log['live'] -= 1
+    log['tombstones'] += 1
+
+    if log['live_counts'][segment_no] == 0 and len(segment) == SEGMENT_SIZE:
+        del log['segments'][segment_no]
+        del log['live_counts'][segment_no]
+        log['tombstones'] -= SEGMENT_SIZE
+
+    # Removed messages still hold their positions, even in released segments
+    removed = len(log['positions']) - log['live']
+    if removed >= COMPACT_MIN_TOMBSTONES and removed > log['live']:
+        compact(log)
+        return True
+    return False
+
+
+def compact(log):
+    '''
+    Rewrite the log without tombstones, the messages keep their order.
+    '''
+    live_messages = list(messages(log))
+    log.update(new_log())
+    for msg in live_messages:
+        append(log, msg)
+
+
+def messages(log):
+    '''
+    Yield every message, oldest first.
+    '''
+    for segment in log['segments'].values():
+        for msg in segment:
+            if msg is not None:
+                yield msg
+
+
+def newest(log, skip=0):
+    '''
+    Yield messages newest first, after skipping the newest skip of them.
+    '''
+    for segment_no in reversed(log['segments']):
+        # Skip whole segments without looking at their messages
+        live = log['live_counts'][segment_no]
+        if skip >= live:
+            skip -= live
+            continue
+
+        for msg in reversed(log['segments'][segment_no]):
+            if msg is None:
+                continue
+            if skip:
+                skip -= 1
+                continue
+            yield msg
+
+
+def older(log, message_id):
+    '''
+    Yield the messages sent before message_id, newest first. message_id
+    may have been removed, as long as it still has a slot.
+    '''
+    slot = log['positions'][message_id]
+    segment_no = slot // SEGMENT_SIZE
+    for msg in reversed(log['segments'].get(segment_no, ())[:slot % SEGMENT_SIZE]):
+        if msg is not None:
+            yield msg
+
+    for earlier_no in range(segment_no - 1, -1, -1):
+        for msg in reversed(log['segments'].get(earlier_no, ())):
+            if msg is not None:
+                yield msg
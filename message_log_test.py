@@ -0,0 +1,114 @@
+'''
+Imported files for message_log_test.
+'''
+import pytest
+import message_log
+
+
+@pytest.fixture
+def small_segments(monkeypatch):
+    monkeypatch.setattr(message_log, 'SEGMENT_SIZE', 4)
+    monkeypatch.setattr(message_log, 'COMPACT_MIN_TOMBSTONES', 4)
+
+def fill(count):
+    log = message_log.new_log()
+    for message_id in range(1, count + 1):
+        message_log.append(log, {'message_id': message_id})
+    return log
+
+def ids(messages):
+    return [msg['message_id'] for msg in messages]
+
+def test_append_and_read(small_segments):
+    '''
+    Testing that messages are split over segments and read back in order.
+    '''
+    log = fill(10)
+
+    assert message_log.length(log) == 10
+    assert len(log['segments']) == 3
+    assert ids(message_log.messages(log)) == list(range(1, 11))
+    assert ids(message_log.newest(log)) == list(range(10, 0, -1))
+    assert message_log.get(log, 7) == {'message_id': 7}
+    assert message_log.get(log, 11) is None
+
+def test_newest_skip(small_segments):
+    '''
+    Testing that newest skips whole segments and tombstones.
+    '''
+    log = fill(10)
+    message_log.remove(log, 9)
+
+    assert ids(message_log.newest(log, 2)) == [7, 6, 5, 4, 3, 2, 1]
+    assert ids(message_log.newest(log, 6)) == [3, 2, 1]
+    assert ids(message_log.newest(log, 9)) == []
+
+def test_older(small_segments):
+    '''
+    Testing that older starts just before the given message.
+    '''
+    log = fill(10)
+    message_log.remove(log, 4)
+
+    assert ids(message_log.older(log, 6)) == [5, 3, 2, 1]
+    assert ids(message_log.older(log, 1)) == []
+
+def test_remove_releases_segment(small_segments):
+    '''
+    Testing that a full segment is released once all its messages are removed.
+    '''
+    log = fill(10)
+    for message_id in (5, 6, 7):
+        message_log.remove(log, message_id)
+    assert 1 in log['segments']
+
+    message_log.remove(log, 8)
+    assert 1 not in log['segments']
+    assert log['tombstones'] == 0
+    assert ids(message_log.messages(log)) == [1, 2, 3, 4, 9, 10]
+    assert ids(message_log.older(log, 9)) == [4, 3, 2, 1]
+
+def test_compaction(small_segments):
+    '''
+    Testing that the log is compacted once tombstones outnumber messages.
+    '''
+    log = fill(10)
+    for message_id in (1, 3, 5, 7, 9, 2):
+        message_log.remove(log, message_id)
+
+    assert log['tombstones'] == 0
+    assert log['next_slot'] == 4
+    assert ids(message_log.messages(log)) == [4, 6, 8, 10]
+    assert message_log.get(log, 8) == {'message_id': 8}
+
+    message_log.append(log, {'message_id': 11})
+    assert ids(message_log.newest(log)) == [11, 10, 8, 6, 4]
+
+def test_older_from_removed(small_segments):
+    '''
+    Testing that older can start from a removed message, even once its segment is released.
+    '''
+    log = fill(10)
+    message_log.remove(log, 3)
+    assert message_log.has_slot(log, 3)
+    assert message_log.get(log, 3) is None
+    assert ids(message_log.older(log, 3)) == [2, 1]
+
+    for message_id in (5, 6, 7, 8):
+        message_log.remove(log, message_id)
+    assert 1 not in log['segments']
+    assert ids(message_log.older(log, 6)) == [4, 2, 1]
+
+    with pytest.raises(KeyError):
+        message_log.remove(log, 3)
+
+def test_compaction_drops_removed_slots(small_segments):
+    '''
+    Testing that removed messages lose their slots once the log is compacted.
+    '''
+    log = fill(10)
+    for message_id in (5, 6, 7, 8, 1, 2):
+        message_log.remove(log, message_id)
+
+    assert not message_log.has_slot(log, 5)
+    assert sorted(log['positions']) == [3, 4, 9, 10]
@@ -792,12 +792,45 @@ def test_messge_send_later_valid(url):
     time_sent = time.timestamp()
 
     raw = raw  = requests.post(f"{url}/message/sendlater", json={'token': payload_1['token'], 'channel_id': payload_2['channel_id'], 'message': 'Hello World', 'time_sent': time_sent})
-    
+
+    # sendlater returns straight away, wait for the message to go out
+    sleep(max(0, time_sent - datetime.datetime.now().timestamp()) + 1)
     search_1 = requests.get(f"{url}/search?token={payload_1['token']}&query_str={'Hello World'}")
     payload6 = search_1.json()
     assert raw.status_code == 200
     assert payload6['messages'][0]['message'] == 'Hello World' 
 
+def test_scheduled_list_and_cancel(url):
+    '''
+    Testing listing and cancelling scheduled messages.
+    '''
+    requests.delete(f"{url}/clear")
+    payload_1 = requests.post(f"{url}/auth/register", json={
+        'email': 'boop2@gmail.com', 
+        'password': 'password', 
+        'name_first': 'boop', 
+        'name_last': 'doop'
+    }).json()
+    payload_2 = requests.post(f"{url}/channels/create", json={
+        'token': payload_1['token'], 
+        'name': 'oneechan', 
+        'is_public': True
+    }).json()
+
+    time_sent = datetime.datetime.now().replace(microsecond=0).timestamp() + 60
+    message_id = requests.post(f"{url}/message/sendlater", json={'token': payload_1['token'], 'channel_id': payload_2['channel_id'], 'message': 'Hello world', 'time_sent': time_sent}).json()['message_id']
+
+    scheduled = requests.get(f"{url}/message/scheduled/list", params={'token': payload_1['token'], 'channel_id': payload_2['channel_id']}).json()
+    assert [msg['message_id'] for msg in scheduled['messages']] == [message_id]
+
+    raw = requests.post(f"{url}/message/scheduled/cancel", json={'token': payload_1['token'], 'message_id': message_id})
+    assert raw.status_code == 200
+    raw = requests.post(f"{url}/message/scheduled/cancel", json={'token': payload_1['token'], 'message_id': message_id})
+    assert raw.status_code == 400
+
+    scheduled = requests.get(f"{url}/message/scheduled/list", params={'token': payload_1['token']}).json()
+    assert scheduled == {'messages': []}
+
 #################################################################################
 #                                                                               #
 #                      message_react server testing functions                   #
@@ -906,7 +939,7 @@ def test_react_invalid_react_id(url):
     raw = requests.post(f"{url}/message/react", json={
         'token': payload_1['token'],
         'message_id': payload_3['message_id'],
-        'react_id': 123123123
+        'react_id': 0
     })
 
     assert raw.status_code == 400
@@ -2,14 +2,19 @@
 Imported files for message_test.
 '''
 import datetime
-import threading
 import pytest
 from error import InputError, AccessError
+import channels
+import message_log
+import scheduler
+import message
 from channels import channels_create
-from channel import channel_join
-from auth import auth_register
+from channel import channel_messages
+from channel import channel_join, channel_leave
+from auth import auth_register, auth_logout
 from other import clear, search
 from message import message_send, message_remove, message_edit, message_sendlater, message_react, message_unreact, message_pin, message_unpin
+from message import message_scheduled_list, message_scheduled_cancel
 
 #################################################################################
 #                                                                               #
@@ -471,21 +476,181 @@ def test_messge_send_later_valid():
     
     print(time_sent)
 
-    def test_sent_later_check(token, message): 
-        messages = search(token, message)
-        assert messages == {'messages': []}
+    message_id = message_sendlater(user_1["token"], channel_1.get('channel_id'), 'Hello world', time_sent)
 
-    timer = threading.Timer(3, test_sent_later_check, args=(user_1['token'], 'Hello world')) 
-    timer.start() 
-    
-    
+    # sendlater returns straight away, the message isn't in the channel yet
+    assert search(user_1['token'], 'Hello world') == {'messages': []}
 
-    message_id = message_sendlater(user_1["token"], channel_1.get('channel_id'), 'Hello world', time_sent)
+    assert scheduler.wait_until_idle(10)
     messages_search = search(user_1['token'], 'Hello world')
     print(messages_search)
     assert messages_search['messages'][0]['message_id'] == message_id['message_id']
     assert messages_search['messages'][0]['time_created'] == time_sent
 
+def test_send_later_id_reserved():
+    '''
+    Testing that a scheduled message keeps the id it was given when messages are sent before it.
+    '''
+    clear()
+    user_1 = auth_register("email1@gmail.com", "password", "First_1", "Last_1")
+    channel_1 = channels_create(user_1.get('token'), 'channel_1', True)['channel_id']
+    time_sent = datetime.datetime.now().replace(microsecond=0).timestamp() + 1
+
+    later_id = message_sendlater(user_1["token"], channel_1, 'later', time_sent)['message_id']
+    now_id = message_send(user_1["token"], channel_1, 'now')['message_id']
+    assert later_id != now_id
+
+    assert scheduler.wait_until_idle(10)
+    messages = channel_messages(user_1["token"], channel_1, 0)['messages']
+    assert [(msg['message_id'], msg['message']) for msg in messages] == [(later_id, 'later'), (now_id, 'now')]
+
+def test_send_later_restored(monkeypatch, tmp_path):
+    '''
+    Testing that a reloaded message keeps its id reserved and is sent without the sender's token.
+    '''
+    journal = tmp_path / 'scheduled.jsonl'
+    monkeypatch.setattr(scheduler, 'JOURNAL_PATH', str(journal))
+    clear()
+    user_1 = auth_register("email1@gmail.com", "password", "First_1", "Last_1")
+    channel_1 = channels_create(user_1.get('token'), 'channel_1', True)['channel_id']
+    time_sent = datetime.datetime.now().replace(microsecond=0).timestamp() + 2
+
+    later_id = message_sendlater(user_1['token'], channel_1, 'later', time_sent)['message_id']
+    assert user_1['token'] not in journal.read_text()
+
+    # Forget the scheduled message, as if the server had restarted
+    with scheduler.QUEUE_LOCK:
+        scheduler.JOBS.clear()
+        scheduler.QUEUE.clear()
+    message.message_ids = []
+    message.scheduled_messages = {}
+    message.user_scheduled = {}
+    message.channel_scheduled = {}
+
+    assert scheduler.load() == 1
+    now_id = message_send(user_1['token'], channel_1, 'now')['message_id']
+    assert now_id != later_id
+
+    # The session is gone by the time it is sent
+    auth_logout(user_1['token'])
+    assert scheduler.wait_until_idle(10)
+    messages = channels.channel_data[channel_1]['messages']
+    assert [(msg['message_id'], msg['message_sent']) for msg in message_log.messages(messages)] == [
+        (now_id, 'now'), (later_id, 'later')]
+    clear()
+
+def test_scheduled_list():
+    '''
+    Testing that scheduled messages are listed soonest first, per user and per channel.
+    '''
+    clear()
+    user_1 = auth_register("email1@gmail.com", "password", "First_1", "Last_1")
+    user_2 = auth_register("email2@gmail.com", "password", "First_2", "Last_2")
+    channel_1 = channels_create(user_1.get('token'), 'channel_1', True)['channel_id']
+    channel_2 = channels_create(user_2.get('token'), 'channel_2', True)['channel_id']
+    channel_join(user_2['token'], channel_1)
+    time_sent = datetime.datetime.now().replace(microsecond=0).timestamp() + 60
+
+    later_id = message_sendlater(user_1['token'], channel_1, 'later', time_sent + 10)['message_id']
+    sooner_id = message_sendlater(user_1['token'], channel_1, 'sooner', time_sent)['message_id']
+    other_id = message_sendlater(user_2['token'], channel_1, 'other', time_sent + 5)['message_id']
+    message_sendlater(user_2['token'], channel_2, 'elsewhere', time_sent)
+
+    scheduled = message_scheduled_list(user_1['token'])['messages']
+    assert scheduled == [
+        {'message_id': sooner_id, 'u_id': user_1['u_id'], 'channel_id': channel_1,
+         'message': 'sooner', 'time_sent': time_sent, 'status': 'pending', 'error': None},
+        {'message_id': later_id, 'u_id': user_1['u_id'], 'channel_id': channel_1,
+         'message': 'later', 'time_sent': time_sent + 10, 'status': 'pending', 'error': None},
+    ]
+
+    scheduled = message_scheduled_list(user_2['token'], channel_1)['messages']
+    assert [msg['message_id'] for msg in scheduled] == [sooner_id, other_id, later_id]
+
+    with pytest.raises(AccessError):
+        message_scheduled_list(user_1['token'], channel_2)
+    with pytest.raises(InputError):
+        message_scheduled_list(user_1['token'], 1234)
+    with pytest.raises(AccessError):
+        message_scheduled_list('invalid_token')
+
+def test_scheduled_cancel():
+    '''
+    Testing that a cancelled message is never sent and drops out of the lists.
+    '''
+    clear()
+    user_1 = auth_register("email1@gmail.com", "password", "First_1", "Last_1")
+    user_2 = auth_register("email2@gmail.com", "password", "First_2", "Last_2")
+    channel_1 = channels_create(user_1.get('token'), 'channel_1', True)['channel_id']
+    channel_join(user_2['token'], channel_1)
+    time_sent = datetime.datetime.now().replace(microsecond=0).timestamp() + 1
+
+    cancelled_id = message_sendlater(user_1['token'], channel_1, 'cancelled', time_sent)['message_id']
+    kept_id = message_sendlater(user_1['token'], channel_1, 'kept', time_sent)['message_id']
+
+    with pytest.raises(AccessError):
+        message_scheduled_cancel(user_2['token'], cancelled_id)
+    assert message_scheduled_cancel(user_1['token'], cancelled_id) == {}
+    with pytest.raises(InputError):
+        message_scheduled_cancel(user_1['token'], cancelled_id)
+
+    scheduled = message_scheduled_list(user_1['token'], channel_1)['messages']
+    assert [msg['message_id'] for msg in scheduled] == [kept_id]
+
+    assert scheduler.wait_until_idle(10)
+    messages = channel_messages(user_1['token'], channel_1, 0)['messages']
+    assert [msg['message_id'] for msg in messages] == [kept_id]
+
+    # Sending is the same as cancelling once it's done
+    assert message_scheduled_list(user_1['token'])['messages'] == []
+    with pytest.raises(InputError):
+        message_scheduled_cancel(user_1['token'], kept_id)
+
+def test_scheduled_failure_listed():
+    '''
+    Testing that a message that can't be sent stays listed as failed until dismissed.
+    '''
+    clear()
+    user_1 = auth_register("email1@gmail.com", "password", "First_1", "Last_1")
+    user_2 = auth_register("email2@gmail.com", "password", "First_2", "Last_2")
+    channel_1 = channels_create(user_1.get('token'), 'channel_1', True)['channel_id']
+    channel_join(user_2['token'], channel_1)
+    time_sent = datetime.datetime.now().replace(microsecond=0).timestamp() + 1
+
+    message_id = message_sendlater(user_2['token'], channel_1, 'hi', time_sent)['message_id']
+    assert message_scheduled_list(user_2['token'])['messages'][0]['status'] == 'pending'
+    channel_leave(user_2['token'], channel_1)
+    assert scheduler.wait_until_idle(10)
+
+    assert channel_messages(user_1['token'], channel_1, 0)['messages'] == []
+    scheduled = message_scheduled_list(user_2['token'])['messages']
+    assert [(msg['message_id'], msg['status']) for msg in scheduled] == [(message_id, 'failed')]
+    assert scheduled[0]['error']
+
+    assert message_scheduled_cancel(user_2['token'], message_id) == {}
+    assert message_scheduled_list(user_2['token'])['messages'] == []
+
+def test_scheduled_index_rebuilt():
+    '''
+    Testing that cancelled entries are cleared out of the index once they're most of it.
+    '''
+    clear()
+    user_1 = auth_register("email1@gmail.com", "password", "First_1", "Last_1")
+    channel_1 = channels_create(user_1.get('token'), 'channel_1', True)['channel_id']
+    time_sent = datetime.datetime.now().replace(microsecond=0).timestamp() + 60
+
+    message_ids = [message_sendlater(user_1['token'], channel_1, 'hi', time_sent + counter)['message_id']
+                   for counter in range(6)]
+    for message_id in message_ids[1:5]:
+        message_scheduled_cancel(user_1['token'], message_id)
+
+    index = message.user_scheduled[user_1['u_id']]
+    assert len(index['heap']) == 6 and index['dead'] == 4
+
+    scheduled = message_scheduled_list(user_1['token'])['messages']
+    assert [msg['message_id'] for msg in scheduled] == [message_ids[0], message_ids[5]]
+    assert len(index['heap']) == 2 and index['dead'] == 0
+
 #################################################################################
 #                                                                               #
 #                      message_react testing functions                          #
@@ -529,7 +694,7 @@ def test_react_invalid_react_id():
     message_info = message_send(user_1.get('token'), channel_1.get('channel_id'), 'Hello world')
 
     with pytest.raises(InputError):
-        message_react(user_1['token'], message_info.get('message_id'), 123123123)
+        message_react(user_1['token'], message_info.get('message_id'), 0)
 
 def test_react_already_reacted():
     '''
@@ -564,6 +729,36 @@ def test_react_valid():
         'is_this_user_reacted': True,
     }]
 
+def test_react_many_ids():
+    '''
+    Testing that any react_id can be used and each is shown to every user.
+    '''
+    clear()
+    user_1 = auth_register('email1@gmail.com', 'password', 'First_1', 'Last_1')
+    user_2 = auth_register('email2@gmail.com', 'password', 'First_2', 'Last_2')
+    channel_1 = channels_create(user_1.get('token'), 'channel_1', True)['channel_id']
+    channel_join(user_2['token'], channel_1)
+    message_id = message_send(user_1.get('token'), channel_1, 'Hello world')['message_id']
+
+    message_react(user_1['token'], message_id, 5)
+    message_react(user_2['token'], message_id, 5)
+    message_react(user_2['token'], message_id, 1)
+    with pytest.raises(InputError):
+        message_react(user_2['token'], message_id, 5)
+
+    reacts = channel_messages(user_1['token'], channel_1, 0)['messages'][0]['reacts']
+    assert reacts == [
+        {'react_id': 1, 'u_ids': [user_2['u_id']], 'is_this_user_reacted': False},
+        {'react_id': 5, 'u_ids': [user_1['u_id'], user_2['u_id']], 'is_this_user_reacted': True},
+    ]
+
+    # Unused reacts other than 1 drop off the message
+    message_unreact(user_1['token'], message_id, 5)
+    message_unreact(user_2['token'], message_id, 5)
+    message_unreact(user_2['token'], message_id, 1)
+    reacts = channel_messages(user_2['token'], channel_1, 0)['messages'][0]['reacts']
+    assert reacts == [{'react_id': 1, 'u_ids': [], 'is_this_user_reacted': False}]
+
  #################################################################################
 #                                                                               #
 #                      message_unreact testing functions                        #
@@ -808,3 +1003,34 @@ def test_valid_unpin_from_inside_channel():
     assert message_search['messages'][0].get('message') == 'Hello world'
     assert message_search['messages'][0].get('is_pinned') == False
     
+
+def test_message_locations_follow_compaction(monkeypatch):
+    '''
+    Testing that edits, pins and reacts still find messages after the log is compacted.
+    '''
+    monkeypatch.setattr(message_log, 'SEGMENT_SIZE', 4)
+    monkeypatch.setattr(message_log, 'COMPACT_MIN_TOMBSTONES', 4)
+    clear()
+    user = auth_register("test@gmail.com", "password", "Firstname", "Lastname")
+    channel_1 = channels_create(user['token'], "channel1", True)['channel_id']
+    channel_2 = channels_create(user['token'], "channel2", True)['channel_id']
+    other_id = message_send(user['token'], channel_2, "other channel")['message_id']
+    message_ids = [message_send(user['token'], channel_1, f"{counter}")['message_id']
+                   for counter in range(10)]
+
+    for index in (0, 1, 2, 4, 5, 6):
+        message_remove(user['token'], message_ids[index])
+    assert channels.message_locations[message_ids[9]] == (channel_1, 3)
+    assert channels.message_locations[other_id] == (channel_2, 0)
+
+    message_edit(user['token'], message_ids[8], "edited")
+    message_pin(user['token'], message_ids[9])
+    message_react(user['token'], message_ids[7], 1)
+    messages = channel_messages(user['token'], channel_1, 0)['messages']
+    assert [msg['message'] for msg in messages] == ["9", "edited", "7", "3"]
+    assert messages[0]['is_pinned']
+    assert messages[2]['reacts'][0]['u_ids'] == [user['u_id']]
+
+    with pytest.raises(InputError):
+        message_edit(user['token'], message_ids[0], "removed")
+    assert message_ids[0] not in channels.message_locations
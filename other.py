@@ -8,19 +8,40 @@ import channel
 import message
 import error
 import standup
+import scheduler
 import helper_functions
+import message_log
 
 def clear():
     '''
     Resets the internal data of the application to it's initial state.
     '''
-    auth.registered_users = []
-    auth.registered_tokens = []
-    auth.reset_codes = []
-    channels.list_of_all_channels = []
-    channels.channel_data = []
+    auth.registered_users = {}
+    auth.registered_emails = {}
+    auth.registered_handles = {}
+    auth.handle_counters = {}
+    auth.registered_tokens = {}
+    auth.user_tokens = {}
+    auth.revoked_tokens = {}
+    auth.revoked_expiry = []
+    auth.revoked_floor = {'iat': 0}
+    auth.reset_codes = {}
+    auth.reset_codes_by_email = {}
+    auth.reset_code_expiry = []
+    channels.channel_data = {}
+    channels.listing = {'channels': None, 'public': None}
+    channels.name_index = []
+    channels.user_channels = {}
+    channels.message_locations = {}
+    channels.owner_channels = {}
+    channels.details_cache = {}
+    channels.member_positions = {}
     channel.registered_channels = []
     message.message_ids = []
+    scheduler.cancel_all()
+    message.scheduled_messages = {}
+    message.user_scheduled = {}
+    message.channel_scheduled = {}
     standup.STANDUPS = []
     standup.CHANNELSMSG = {}
 
@@ -29,12 +50,13 @@ def users_all(token):
     Returns a list of all users and their associated details
     '''
     # Checking is the token exist then getting their u_id
-    if helper_functions.check_token(token).get('token_status'):
+    auth_user = helper_functions.auth_context(token)
+    if auth_user.get('token_status'):
         raise error.AccessError(description="Token invalid")
 
     # Returning all users and their details
     all_user_detail = []
-    for users in auth.registered_users:
+    for users in auth.registered_users.values():
         user_detail = {
                 'u_id': users.get('u_id'),
                 'email': users.get('email'),
@@ -56,39 +78,26 @@ def admin_userpermission_change(token, u_id, permission_id):
 
     # check for valid user:
     # Checking is the token exist then getting their u_id
-    if helper_functions.check_token(token).get('token_status'):
+    auth_user = helper_functions.auth_context(token)
+    if auth_user.get('token_status'):
         raise error.AccessError(description="Token invalid")
     
-    token_uid = helper_functions.check_token(token).get('u_id')
-    
     #If u_id valid
     if helper_functions.check_uid_valid(u_id):
         raise error.InputError(description="Invalid u_id")
 
 
     #If token is not owner
-    not_owner = True
-    for user in auth.registered_users:
-        if user.get("u_id") == token_uid:
-            if user.get("permissions") == 1:
-                not_owner = False
-                break 
-
-    if not_owner:
+    if auth_user['user'].get("permissions") != 1:
         raise error.AccessError("Authorised user is not owner")
     
     #Update u_id permissions
-    for user in auth.registered_users:
-        if user.get("u_id") == u_id:
-            user["permissions"] = permission_id
-            break
+    auth.registered_users[u_id]["permissions"] = permission_id
 
     #If member in channel also add to owner
     if permission_id == 1:
-        for data in channels.channel_data:
-            if u_id in data.get('member_ids'):
-                if u_id not in data.get('owner_ids'):
-                    data.get('owner_ids').append(u_id)
+        for channel_id in channels.user_channels.get(u_id, ()):
+            channels.add_owner(channels.channel_data[channel_id], u_id)
 
     return {}    
 
@@ -97,42 +106,23 @@ def search(token, query_str):
     Searches all channel messages and uses regex to find similar messages.
     '''
     # Checking is the token exist then getting their u_id
-    if helper_functions.check_token(token).get('token_status'):
+    auth_user = helper_functions.auth_context(token)
+    if auth_user.get('token_status'):
         raise error.AccessError(description="Token invalid")
     
-    u_id = helper_functions.check_token(token).get('u_id')
+    u_id = auth_user.get('u_id')
 
     messages = []
 
     #return dictionary of details of query string
-    for chan in channels.channel_data:
-        for user in chan.get("member_ids"):
-            if user == u_id:
-                for line in chan.get("messages"):
-                    if line.get('message_sent') is None:
-                        break
-                    
-                    #Seeing if user has reacted
-                    is_this_user_reacted = False
-
-                    if u_id in line.get('reacts')[0]['u_ids']:
-                        is_this_user_reacted = True 
-
-                    if re.search(str(query_str), line.get('message_sent')):
-                        msg = {
-                            'message_id': line.get('message_id'),
-                            'u_id': line.get('user_id'),
-                            'message': line.get('message_sent'),
-                            'time_created': line.get('time_created'),
-                            'reacts': [{
-                                'react_id': line.get('reacts')[0].get('react_id'),
-                                'u_ids': line.get('reacts')[0].get('u_ids'),
-                                'is_this_user_reacted': is_this_user_reacted,
-                            }],
-                            'is_pinned': line.get('is_pinned'),
-                        }
-
-                        messages.append(msg)
-                   
+    for channel_id in sorted(channels.user_channels.get(u_id, ())):
+        chan = channels.channel_data[channel_id]
+        for line in message_log.messages(chan.get("messages")):
+            if line.get('message_sent') is None:
+                break
+
+            if re.search(str(query_str), line.get('message_sent')):
+                messages.append(helper_functions.format_message(line, u_id))
+           
 
     return {'messages': messages}
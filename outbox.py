@@ -0,0 +1,186 @@
+'''
+Outbox queues emails so requests don't wait on SMTP, and sends them from
+background workers that keep their connection open between batches.
+'''
+import queue
+import smtplib
+import threading
+from email.mime.text import MIMEText
+
+# SMTP settings
+SMTP_HOST = 'smtp.gmail.com'
+SMTP_PORT = 465
+SMTP_SSL = True
+SMTP_USER = 'fridaygrape1@gmail.com'
+SMTP_PASSWORD = 'comp1531'
+SMTP_TIMEOUT = 10
+SENDER = 'fridaygrape1@gmail.com'
+
+# Number of workers, each holding one pooled connection
+WORKERS = 2
+# Most emails sent over a connection before taking the next batch
+BATCH_SIZE = 50
+# Seconds a pooled connection can sit idle before it is closed
+IDLE_TIMEOUT = 30
+# Attempts per email before it is dropped
+MAX_ATTEMPTS = 5
+# Seconds before the first retry, doubled on each retry after
+BACKOFF = 1
+
+# [{to, subject, body, attempts}]
+OUTBOX = queue.Queue()
+
+# Counts of emails sent, retried and dropped
+STATS = {'sent': 0, 'retried': 0, 'failed': 0}
+
+# Emails queued or waiting on a retry
+PENDING = {'count': 0}
+PENDING_LOCK = threading.Condition()
+
+# Bumped to make workers drop their pooled connections, e.g. after the
+# SMTP settings change
+POOL = {'generation': 0}
+
+WORKER_THREADS = []
+WORKER_LOCK = threading.Lock()
+
+
+def send_email(receiver, subject, body):
+    '''
+    Queue an email and return straight away.
+    '''
+    with PENDING_LOCK:
+        PENDING['count'] += 1
+
+    start_workers()
+    OUTBOX.put({
+        'to': receiver,
+        'subject': subject,
+        'body': body,
+        'attempts': 0,
+    })
+    return {}
+
+
+def wait_until_sent(timeout=None):
+    '''
+    Block until every queued email is sent or dropped, returns False on timeout.
+    '''
+    with PENDING_LOCK:
+        return PENDING_LOCK.wait_for(lambda: PENDING['count'] == 0, timeout)
+
+
+def reset_connections():
+    '''
+    Make every worker reconnect before its next batch.
+    '''
+    POOL['generation'] += 1
+
+
+def start_workers():
+    '''
+    Start the worker threads if they aren't running yet.
+    '''
+    with WORKER_LOCK:
+        while len(WORKER_THREADS) < WORKERS:
+            worker = threading.Thread(target=helper_worker, daemon=True)
+            worker.start()
+            WORKER_THREADS.append(worker)
+
+
+def helper_connect():
+    '''
+    Open and log in to a new SMTP connection.
+    '''
+    if SMTP_SSL:
+        server = smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT)
+    else:
+        server = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT)
+
+    if SMTP_USER:
+        server.login(SMTP_USER, SMTP_PASSWORD)
+    return server
+
+
+def helper_close(server):
+    '''
+    Close a connection, ignoring errors from one that has already dropped.
+    '''
+    if server is not None:
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            server.close()
+
+
+def helper_done(count, stat):
+    '''
+    Mark emails as no longer pending and count them under stat.
+    '''
+    with PENDING_LOCK:
+        PENDING['count'] -= count
+        STATS[stat] += count
+        PENDING_LOCK.notify_all()
+
+
+def helper_retry(mail):
+    '''
+    Queue a failed email again after a backoff, or drop it.
+    '''
+    mail['attempts'] += 1
+    if mail['attempts'] >= MAX_ATTEMPTS:
+        helper_done(1, 'failed')
+        return
+
+    with PENDING_LOCK:
+        STATS['retried'] += 1
+    delay = BACKOFF * 2 ** (mail['attempts'] - 1)
+    timer = threading.Timer(delay, OUTBOX.put, args=[mail])
+    timer.daemon = True
+    timer.start()
+
+
+def helper_worker():
+    '''
+    Take batches off the outbox and send them over one pooled connection.
+    '''
+    server = None
+    generation = POOL['generation']
+    while True:
+        try:
+            batch = [OUTBOX.get(timeout=IDLE_TIMEOUT)]
+        except queue.Empty:
+            helper_close(server)
+            server = None
+            continue
+
+        while len(batch) < BATCH_SIZE:
+            try:
+                batch.append(OUTBOX.get_nowait())
+            except queue.Empty:
+                break
+
+        if generation != POOL['generation']:
+            helper_close(server)
+            server = None
+            generation = POOL['generation']
+
+        sent = 0
+        try:
+            if server is None:
+                server = helper_connect()
+            for mail in batch:
+                msg = MIMEText(mail['body'])
+                msg['Subject'] = mail['subject']
+                msg['From'] = SENDER
+                msg['To'] = mail['to']
+                server.sendmail(SENDER, [mail['to']], msg.as_string())
+                sent += 1
+        except (smtplib.SMTPException, OSError):
+            # Reconnect for the next batch and retry what wasn't sent
+            helper_close(server)
+            server = None
+            for mail in batch[sent:]:
+                helper_retry(mail)
+
+        helper_done(sent, 'sent')
@@ -0,0 +1,140 @@
+'''
+Imported files for outbox_test.
+'''
+import socketserver
+import pytest
+import auth
+import outbox
+from other import clear
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    '''
+    Speaks just enough SMTP for smtplib to send through it.
+    '''
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply('220 localhost ready')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                break
+            verb = line.decode().strip()[:4].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250 localhost')
+            elif verb == 'MAIL' and self.server.reject > 0:
+                self.server.reject -= 1
+                self.reply('451 try again later')
+            elif verb == 'DATA':
+                self.reply('354 end data with <CR><LF>.<CR><LF>')
+                data = []
+                for data_line in self.rfile:
+                    if data_line == b'.\r\n':
+                        break
+                    data.append(data_line.decode())
+                self.server.messages.append(''.join(data))
+                self.reply('250 queued')
+            elif verb == 'QUIT':
+                self.reply('221 bye')
+                break
+            else:
+                self.reply('250 ok')
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    '''
+    Local SMTP server that records the messages it receives.
+    '''
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.messages = []
+        self.connections = 0
+        self.reject = 0
+
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    server = SMTPStandIn()
+    monkeypatch.setattr(outbox, 'SMTP_HOST', '127.0.0.1')
+    monkeypatch.setattr(outbox, 'SMTP_PORT', server.server_address[1])
+    monkeypatch.setattr(outbox, 'SMTP_SSL', False)
+    monkeypatch.setattr(outbox, 'SMTP_USER', None)
+    monkeypatch.setattr(outbox, 'BACKOFF', 0.01)
+
+    with server:
+        socketserver.threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        # Flush emails left from earlier tests and drop their connections
+        outbox.reset_connections()
+        outbox.wait_until_sent(10)
+        outbox.reset_connections()
+        server.messages.clear()
+        server.connections = 0
+
+        yield server
+        server.shutdown()
+
+def test_send_email(smtp_server):
+    '''
+    Testing that a queued email reaches the SMTP server.
+    '''
+    outbox.send_email('someone@gmail.com', 'Subject', 'hello there')
+    assert outbox.wait_until_sent(5)
+
+    assert len(smtp_server.messages) == 1
+    assert 'hello there' in smtp_server.messages[0]
+    assert 'To: someone@gmail.com' in smtp_server.messages[0]
+
+def test_connections_reused(smtp_server):
+    '''
+    Testing that many emails share a few pooled connections.
+    '''
+    for i in range(20):
+        outbox.send_email(f'user{i}@gmail.com', 'Subject', f'message {i}')
+    assert outbox.wait_until_sent(5)
+
+    assert len(smtp_server.messages) == 20
+    assert smtp_server.connections <= outbox.WORKERS
+
+def test_retry_with_backoff(smtp_server):
+    '''
+    Testing that an email is retried after the server turns it away.
+    '''
+    smtp_server.reject = 2
+    retried = outbox.STATS['retried']
+    outbox.send_email('someone@gmail.com', 'Subject', 'try again')
+    assert outbox.wait_until_sent(5)
+
+    assert outbox.STATS['retried'] - retried == 2
+    assert len(smtp_server.messages) == 1
+
+def test_dropped_after_max_attempts(smtp_server, monkeypatch):
+    '''
+    Testing that an email is dropped after MAX_ATTEMPTS failures.
+    '''
+    monkeypatch.setattr(outbox, 'MAX_ATTEMPTS', 2)
+    smtp_server.reject = 5
+    failed = outbox.STATS['failed']
+    outbox.send_email('someone@gmail.com', 'Subject', 'never sent')
+    assert outbox.wait_until_sent(5)
+
+    assert outbox.STATS['failed'] - failed == 1
+    assert smtp_server.messages == []
+
+def test_passwordreset_request_queued(smtp_server):
+    '''
+    Testing that auth_passwordreset_request sends the reset code through the outbox.
+    '''
+    clear()
+    auth.auth_register("fridaygrape1@gmail.com", "password", "First", "Last")
+    auth.auth_passwordreset_request("fridaygrape1@gmail.com")
+    assert outbox.wait_until_sent(5)
+
+    assert len(smtp_server.messages) == 1
+    assert 'Subject: Reset Code' in smtp_server.messages[0]
@@ -0,0 +1,257 @@
+'''
+Scheduler runs jobs at their due time from one dispatcher thread, so a
+handler that schedules work returns straight away. Pending jobs can be
+journaled to an append-only file and reloaded after a restart.
+'''
+import os
+import json
+import heapq
+import threading
+import time
+import traceback
+
+# Functions jobs can run, by name so the journal can refer to them
+# {name: {'function': function, 'restore': function or None}}
+HANDLERS = {}
+
+# {job_id: {'due', 'name', 'args'}} for every job that hasn't run or been cancelled
+JOBS = {}
+# Min-heap of (due, job_id), job ids go up so equal times keep their order.
+# Entries whose job is no longer in JOBS are skipped when they come up.
+QUEUE = []
+QUEUE_LOCK = threading.Condition()
+NEXT_JOB = {'id': 1}
+
+# Jobs taken off the queue that haven't finished yet, and the one running now
+RUNNING = {'count': 0, 'job_id': None}
+
+# File the jobs are journaled to, None keeps them in memory only
+JOURNAL_PATH = None
+# Rewrite the journal once it has this many finished jobs and more finished than pending
+COMPACT_MIN_FINISHED = 1000
+JOURNAL = {'finished': 0}
+
+DISPATCHER = []
+DISPATCHER_LOCK = threading.Lock()
+
+
+def register(name, function, restore=None):
+    '''
+    Let jobs run function under name. restore(job_id, due, *args) is called for
+    each job of this name reloaded from the journal, to rebuild in-memory state.
+    '''
+    HANDLERS[name] = {'function': function, 'restore': restore}
+
+
+def schedule(due, name, *args):
+    '''
+    Run the handler name with args at the unix time due, or as soon as possible
+    if due has passed. args must be JSON serialisable, returns the job_id.
+    '''
+    start_dispatcher()
+    with QUEUE_LOCK:
+        job_id = NEXT_JOB['id']
+        NEXT_JOB['id'] += 1
+        JOBS[job_id] = {'due': due, 'name': name, 'args': list(args)}
+        helper_journal({'op': 'add', 'id': job_id, 'due': due, 'name': name, 'args': list(args)})
+        heapq.heappush(QUEUE, (due, job_id))
+        QUEUE_LOCK.notify_all()
+    return job_id
+
+
+def extend(job_id, value):
+    '''
+    Append value to the list that is the job's last argument, returns False
+    if the job already started or finished.
+    '''
+    with QUEUE_LOCK:
+        if job_id not in JOBS or RUNNING['job_id'] == job_id:
+            return False
+        JOBS[job_id]['args'][-1].append(value)
+        helper_journal({'op': 'extend', 'id': job_id, 'value': value})
+        return True
+
+
+def cancel(job_id):
+    '''
+    Drop a job that hasn't started, returns False if it already started or finished.
+    Its queue entry is left to be skipped when it comes up.
+    '''
+    with QUEUE_LOCK:
+        if job_id not in JOBS or RUNNING['job_id'] == job_id:
+            return False
+        helper_finish_job(job_id)
+        QUEUE_LOCK.notify_all()
+        return True
+
+
+def cancel_all():
+    '''
+    Drop every job that hasn't started.
+    '''
+    with QUEUE_LOCK:
+        JOBS.clear()
+        QUEUE.clear()
+        JOURNAL['finished'] = 0
+        if JOURNAL_PATH:
+            open(JOURNAL_PATH, 'w').close()
+        QUEUE_LOCK.notify_all()
+
+
+def pending():
+    '''
+    Return the number of jobs that haven't finished.
+    '''
+    with QUEUE_LOCK:
+        return len(JOBS)
+
+
+def wait_until_idle(timeout=None):
+    '''
+    Block until every job has run, returns False on timeout.
+    '''
+    with QUEUE_LOCK:
+        return QUEUE_LOCK.wait_for(lambda: not JOBS and RUNNING['count'] == 0, timeout)
+
+
+def load():
+    '''
+    Reload the pending jobs from the journal, jobs that fell due while the
+    server was down run straight away.
+    '''
+    if not JOURNAL_PATH or not os.path.exists(JOURNAL_PATH):
+        return 0
+
+    with QUEUE_LOCK:
+        with open(JOURNAL_PATH) as journal:
+            for line in journal:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # The last line can be cut short by a crash
+                    continue
+
+                if record['op'] == 'add':
+                    JOBS[record['id']] = {'due': record['due'], 'name': record['name'],
+                                          'args': record['args']}
+                    NEXT_JOB['id'] = max(NEXT_JOB['id'], record['id'] + 1)
+                elif record['id'] not in JOBS:
+                    continue
+                elif record['op'] == 'extend':
+                    JOBS[record['id']]['args'][-1].append(record['value'])
+                elif record['op'] == 'done':
+                    del JOBS[record['id']]
+
+        for job_id, job in JOBS.items():
+            heapq.heappush(QUEUE, (job['due'], job_id))
+            restore = HANDLERS[job['name']]['restore']
+            if restore is not None:
+                restore(job_id, job['due'], *job['args'])
+
+        helper_compact()
+        loaded = len(JOBS)
+        QUEUE_LOCK.notify_all()
+
+    start_dispatcher()
+    return loaded
+
+
+def start_dispatcher():
+    '''
+    Start the dispatcher thread if it isn't running yet.
+    '''
+    with DISPATCHER_LOCK:
+        if not DISPATCHER:
+            dispatcher = threading.Thread(target=helper_dispatch, daemon=True)
+            dispatcher.start()
+            DISPATCHER.append(dispatcher)
+
+
+def helper_journal(record):
+    '''
+    Append a record to the journal, called holding QUEUE_LOCK.
+    '''
+    if JOURNAL_PATH:
+        with open(JOURNAL_PATH, 'a') as journal:
+            journal.write(json.dumps(record) + '\n')
+
+
+def helper_compact():
+    '''
+    Rewrite the journal with only the pending jobs, called holding QUEUE_LOCK.
+    '''
+    JOURNAL['finished'] = 0
+    if not JOURNAL_PATH:
+        return
+
+    temp_path = JOURNAL_PATH + '.tmp'
+    with open(temp_path, 'w') as journal:
+        for job_id, job in JOBS.items():
+            journal.write(json.dumps({'op': 'add', 'id': job_id, 'due': job['due'],
+                                      'name': job['name'], 'args': job['args']}) + '\n')
+    os.replace(temp_path, JOURNAL_PATH)
+
+
+def helper_next_job():
+    '''
+    Wait for the earliest job to fall due and take it off the queue.
+    '''
+    with QUEUE_LOCK:
+        while True:
+            if not QUEUE:
+                QUEUE_LOCK.wait()
+                continue
+
+            due, job_id = QUEUE[0]
+            if job_id not in JOBS:
+                heapq.heappop(QUEUE)
+                continue
+
+            delay = due - time.time()
+            if delay > 0:
+                # Woken early if a sooner job is scheduled
+                QUEUE_LOCK.wait(delay)
+                continue
+
+            heapq.heappop(QUEUE)
+            RUNNING['count'] += 1
+            RUNNING['job_id'] = job_id
+            return job_id, JOBS[job_id]
+
+
+def helper_finish(job_id):
+    '''
+    Record that a job has run, compacting the journal when it is mostly finished jobs.
+    '''
+    with QUEUE_LOCK:
+        RUNNING['count'] -= 1
+        RUNNING['job_id'] = None
+        if job_id in JOBS:
+            helper_finish_job(job_id)
+        QUEUE_LOCK.notify_all()
+
+
+def helper_finish_job(job_id):
+    '''
+    Forget a job and journal it as done, called holding QUEUE_LOCK.
+    '''
+    del JOBS[job_id]
+    helper_journal({'op': 'done', 'id': job_id})
+    JOURNAL['finished'] += 1
+    if JOURNAL['finished'] >= COMPACT_MIN_FINISHED and JOURNAL['finished'] > len(JOBS):
+        helper_compact()
+
+
+def helper_dispatch():
+    '''
+    Run jobs as they fall due, one at a time.
+    '''
+    while True:
+        job_id, job = helper_next_job()
+        try:
+            HANDLERS[job['name']]['function'](*job['args'])
+        except Exception:
+            # A failing job mustn't stop the jobs after it
+            traceback.print_exc()
+        finally:
+            helper_finish(job_id)
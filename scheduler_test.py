@@ -0,0 +1,161 @@
+'''
+Imported files for scheduler_test.
+'''
+import json
+import time
+import pytest
+import scheduler
+
+RAN = []
+
+
+@pytest.fixture
+def handlers():
+    scheduler.cancel_all()
+    RAN.clear()
+    scheduler.register('record', RAN.append)
+    scheduler.register('fail', lambda: 1 / 0)
+    yield
+    scheduler.cancel_all()
+
+@pytest.fixture
+def journal(monkeypatch, tmp_path, handlers):
+    path = tmp_path / 'scheduled.jsonl'
+    monkeypatch.setattr(scheduler, 'JOURNAL_PATH', str(path))
+    return path
+
+def restart():
+    '''
+    Forget the jobs held in memory, as if the server had restarted.
+    '''
+    with scheduler.QUEUE_LOCK:
+        scheduler.JOBS.clear()
+        scheduler.QUEUE.clear()
+
+def test_runs_in_due_order(handlers):
+    '''
+    Testing that jobs run in due order, not the order they were scheduled.
+    '''
+    now = time.time()
+    scheduler.schedule(now + 0.3, 'record', 'third')
+    scheduler.schedule(now + 0.1, 'record', 'first')
+    scheduler.schedule(now + 0.2, 'record', 'second')
+    assert scheduler.wait_until_idle(5)
+
+    assert RAN == ['first', 'second', 'third']
+
+def test_sooner_job_wakes_dispatcher(handlers):
+    '''
+    Testing that a job due sooner than the one being waited on isn't held up.
+    '''
+    scheduler.schedule(time.time() + 2, 'record', 'late')
+    start = time.time()
+    scheduler.schedule(start, 'record', 'soon')
+
+    deadline = time.time() + 1
+    while not RAN and time.time() < deadline:
+        time.sleep(0.01)
+
+    assert RAN == ['soon']
+    assert time.time() - start < 1
+
+def test_failing_job_doesnt_stop_dispatcher(handlers):
+    '''
+    Testing that the jobs after one that raises still run.
+    '''
+    scheduler.schedule(time.time(), 'fail')
+    scheduler.schedule(time.time(), 'record', 'after')
+    assert scheduler.wait_until_idle(5)
+
+    assert RAN == ['after']
+
+def test_cancel_all(handlers):
+    '''
+    Testing that cancelled jobs never run.
+    '''
+    scheduler.schedule(time.time() + 0.2, 'record', 'cancelled')
+    assert scheduler.pending() == 1
+    scheduler.cancel_all()
+    assert scheduler.wait_until_idle(5)
+    time.sleep(0.3)
+
+    assert RAN == []
+
+def test_reload_pending_jobs(journal):
+    '''
+    Testing that jobs still pending are reloaded and overdue ones run straight away.
+    '''
+    restored = []
+    scheduler.register('later', RAN.append, lambda job_id, due, *args: restored.append(args))
+    scheduler.schedule(time.time() + 0.2, 'record', 'overdue')
+    scheduler.schedule(time.time() + 60, 'later', [])
+    restart()
+
+    time.sleep(0.3)
+    assert scheduler.load() == 2
+    assert scheduler.wait_until_idle(0.5) == False
+    assert RAN == ['overdue']
+    assert restored == [([],)]
+    assert scheduler.pending() == 1
+
+def test_reload_extended_args(journal):
+    '''
+    Testing that values added with extend survive a reload.
+    '''
+    job_id = scheduler.schedule(time.time() + 0.3, 'record', [])
+    scheduler.extend(job_id, 'one')
+    scheduler.extend(job_id, 'two')
+    restart()
+
+    assert scheduler.load() == 1
+    assert scheduler.wait_until_idle(5)
+    assert RAN == [['one', 'two']]
+
+def test_finished_jobs_not_reloaded(journal):
+    '''
+    Testing that jobs that ran or were cancelled don't come back.
+    '''
+    scheduler.schedule(time.time(), 'record', 'once')
+    assert scheduler.wait_until_idle(5)
+    restart()
+
+    assert scheduler.load() == 0
+    assert RAN == ['once']
+
+def test_journal_compacted(journal, monkeypatch):
+    '''
+    Testing that the journal is rewritten once most of it is finished jobs.
+    '''
+    monkeypatch.setattr(scheduler, 'COMPACT_MIN_FINISHED', 3)
+    scheduler.schedule(time.time() + 60, 'record', 'pending')
+    for counter in range(3):
+        scheduler.schedule(time.time(), 'record', counter)
+    assert scheduler.wait_until_idle(0.5) == False
+
+    records = [json.loads(line) for line in journal.read_text().splitlines()]
+    assert [(record['op'], record['args']) for record in records] == [('add', ['pending'])]
+
+def test_cancel(journal):
+    '''
+    Testing that a cancelled job never runs and isn't reloaded.
+    '''
+    cancelled = scheduler.schedule(time.time() + 0.2, 'record', 'cancelled')
+    scheduler.schedule(time.time() + 0.2, 'record', 'kept')
+
+    assert scheduler.cancel(cancelled)
+    assert not scheduler.cancel(cancelled)
+    assert scheduler.wait_until_idle(5)
+    assert RAN == ['kept']
+
+    restart()
+    assert scheduler.load() == 0
+
+def test_extend_finished_job(handlers):
+    '''
+    Testing that extending a job that already ran is refused.
+    '''
+    job_id = scheduler.schedule(time.time(), 'record', [])
+    assert scheduler.wait_until_idle(5)
+
+    assert not scheduler.extend(job_id, 'late')
+    assert RAN == [[]]
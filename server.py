@@ -8,12 +8,14 @@ from flask_cors import CORS
 from error import InputError
 
 import auth
+import helper_functions
 import channels
 import channel
 import other
 import message
 import user
 import standup
+import scheduler
 
 def defaultHandler(err):
     response = err.get_response()
@@ -32,6 +34,10 @@ CORS(APP)
 APP.config['TRAP_HTTP_EXCEPTIONS'] = True
 APP.register_error_handler(Exception, defaultHandler)
 
+# Resolve each token at most once per request
+APP.before_request(helper_functions.begin_request)
+APP.teardown_request(helper_functions.end_request)
+
 # Example
 @APP.route("/echo", methods=['GET'])
 def echo():
@@ -58,6 +64,15 @@ def auth_register():
     return_value = auth.auth_register(auth_info['email'], auth_info['password'], auth_info['name_first'], auth_info['name_last'])
     return dumps(return_value)
 
+@APP.route("/auth/register/bulk", methods=['POST'])
+def auth_register_bulk():
+    '''
+    POST HTTP method for auth_register_bulk.
+    '''
+    auth_info = request.get_json()
+    return_value = auth.auth_register_bulk(auth_info['users'])
+    return dumps(return_value)
+
 @APP.route("/auth/login", methods=['POST'])
 def auth_login():
     '''
@@ -124,7 +139,12 @@ def channels_listall():
     GET HTTP method for channels_listall.
     '''
     token = request.args.get('token')
-    return_value = channels.channels_listall(token)
+    start = int(request.args.get('start', 0))
+    limit = request.args.get('limit')
+    public_only = request.args.get('public_only', 'false').lower() in ('true', '1')
+    name_prefix = request.args.get('name_prefix')
+    return_value = channels.channels_listall(token, start, None if limit is None else int(limit),
+                                             public_only, name_prefix)
     return dumps(return_value)
 
 #################################################################################
@@ -142,6 +162,16 @@ def channel_invite():
     channel.channel_invite(channel_info['token'], channel_info['channel_id'], channel_info['u_id'])
     return dumps({})
 
+@APP.route("/channel/invite/bulk", methods=['POST'])
+def channel_invite_bulk():
+    '''
+    POST HTTP method for channel_invite_bulk.
+    '''
+    channel_info = request.get_json()
+    return_value = channel.channel_invite_bulk(channel_info['token'], int(channel_info['channel_id']),
+                                               channel_info['u_ids'])
+    return dumps(return_value)
+
 @APP.route("/channel/details", methods=['GET'])
 def channel_details():
     '''
@@ -152,6 +182,29 @@ def channel_details():
     return_value = channel.channel_details(token, int(channel_id))
     return dumps(return_value)
 
+@APP.route("/channel/details/summary", methods=['GET'])
+def channel_details_summary():
+    '''
+    GET HTTP method for channel_details_summary.
+    '''
+    token = request.args.get('token')
+    channel_id = request.args.get('channel_id')
+    return_value = channel.channel_details_summary(token, int(channel_id))
+    return dumps(return_value)
+
+@APP.route("/channel/members", methods=['GET'])
+def channel_members():
+    '''
+    GET HTTP method for channel_members.
+    '''
+    token = request.args.get('token')
+    channel_id = request.args.get('channel_id')
+    after = request.args.get('after')
+    limit = request.args.get('limit', 50)
+    return_value = channel.channel_members(token, int(channel_id),
+                                           None if after is None else int(after), int(limit))
+    return dumps(return_value)
+
 @APP.route("/channel/leave", methods=['POST'])
 def channel_leave():
     '''
@@ -195,6 +248,16 @@ def channel_messages():
     '''
     token = request.args.get('token')
     channel_id = request.args.get('channel_id')
+
+    #Cursor mode when before or limit is given
+    if 'before' in request.args or 'limit' in request.args:
+        before = request.args.get('before')
+        limit = request.args.get('limit', 50)
+        return_value = channel.channel_messages_before(token, int(channel_id),
+                                                       None if before is None else int(before),
+                                                       int(limit))
+        return dumps(return_value)
+
     start = request.args.get('start')
     return_value = channel.channel_messages(token, int(channel_id), int(start))
     return dumps(return_value)
@@ -301,6 +364,25 @@ def message_sendlater():
     message_return = message.message_sendlater(message_info['token'], int(message_info['channel_id']), message_info['message'], int(message_info['time_sent']))
     return dumps(message_return)
 
+@APP.route("/message/scheduled/list", methods=['GET'])
+def message_scheduled_list():
+    '''
+    GET HTTP method for message_scheduled_list.
+    '''
+    token = request.args.get('token')
+    channel_id = request.args.get('channel_id')
+    return_value = message.message_scheduled_list(token, None if channel_id is None else int(channel_id))
+    return dumps(return_value)
+
+@APP.route("/message/scheduled/cancel", methods=['POST'])
+def message_scheduled_cancel():
+    '''
+    POST HTTP method for message_scheduled_cancel.
+    '''
+    message_info = request.get_json()
+    message.message_scheduled_cancel(message_info['token'], int(message_info['message_id']))
+    return dumps({})
+
 @APP.route("/message/react", methods=['POST'])
 def message_react():
     '''
@@ -415,4 +497,7 @@ def standup_send():
 
 
 if __name__ == "__main__":
+    # Keep scheduled messages and standups across restarts
+    scheduler.JOURNAL_PATH = 'scheduled_jobs.jsonl'
+    scheduler.load()
     APP.run(port=0) # Do not edit this port
@@ -3,48 +3,46 @@ import auth
 from datetime import datetime, timedelta
 import time
 import error
-import threading
 from channel import channel_messages
 import channels
-from message import message_send
+from message import helper_deliver
 import helper_functions
+import scheduler
 
-#{channel_id, time_finish}
+#{channel_id, time_finish, job_id}
 STANDUPS = []
 
-#{channel_id: [messages]}
+#{channel_id: [messages]}, each list is also the last argument of the standup's job
 CHANNELSMSG = {}
 
 
-def helper_send_message(token, channel_id):
+def helper_send_message(u_id, channel_id, message_queue):
     '''
     Check if length has finished and then send message
     '''
 
-    message_queue = CHANNELSMSG[channel_id]
     string = ""
     for message in message_queue:
         string += message + '\n'
 
     string = string.rstrip('\n')
 
-    message_send(token, channel_id, string)
-
-    # emove the standup from QUEUES and STANDUPS
+    # Remove the standup from QUEUES and STANDUPS first, so it ends even if sending fails
     del CHANNELSMSG[channel_id]
 
     for standup in STANDUPS:
         if standup['channel_id'] == channel_id:
             STANDUPS.remove(standup)
 
-    return
+    helper_deliver(u_id, channel_id, string)
 
 def standup_start(token, channel_id, length):
     '''
     Begin the standup
     '''
     # Checking is the token exist then getting their u_id
-    if helper_functions.check_token(token).get('token_status'):
+    auth_user = helper_functions.auth_context(token)
+    if auth_user.get('token_status'):
         raise error.AccessError(description="Token invalid")
     
 
@@ -61,16 +59,24 @@ def standup_start(token, channel_id, length):
     dt_finish = datetime.now() + timedelta(seconds=length)
     time_finish = dt_finish.timestamp()
 
-    #Append startup to STANDUPS
-    STANDUPS.append({'channel_id': channel_id, 'time_finish': int(time_finish)})
+    #Schedule the messages to be sent when it ends, the scheduler keeps the job across restarts
+    #The job holds the u_id rather than the token, which may be gone when it runs
+    u_id = auth_user.get('u_id')
+    message_queue = []
+    job_id = scheduler.schedule(time_finish, 'standup_send', u_id, channel_id, message_queue)
+    helper_restore_standup(job_id, time_finish, u_id, channel_id, message_queue)
 
-    #Append to CHANNELMSGS
-    CHANNELSMSG[channel_id] = []
+    return {'time_finish': int(time_finish)}
 
-    t = threading.Timer(int(length), helper_send_message, args=[token, channel_id])
-    t.start()
+def helper_restore_standup(job_id, time_finish, u_id, channel_id, message_queue):
+    '''
+    Add a scheduled standup to STANDUPS and CHANNELSMSG
+    '''
+    #Append startup to STANDUPS
+    STANDUPS.append({'channel_id': channel_id, 'time_finish': int(time_finish), 'job_id': job_id})
 
-    return {'time_finish': int(time_finish)}
+    #Append to CHANNELMSGS
+    CHANNELSMSG[channel_id] = message_queue
    
 
 def standup_active(token, channel_id):
@@ -78,7 +84,8 @@ def standup_active(token, channel_id):
     Check if standup is active
     '''
     # Checking is the token exist 
-    if helper_functions.check_token(token).get('token_status'):
+    auth_user = helper_functions.auth_context(token)
+    if auth_user.get('token_status'):
         raise error.AccessError(description="Token invalid")
     
     #If channel valid
@@ -103,11 +110,10 @@ def standup_send(token, channel_id, message):
     Send message in standup
     '''
     # Checking is the token exist 
-    if helper_functions.check_token(token).get('token_status'):
+    auth_user = helper_functions.auth_context(token)
+    if auth_user.get('token_status'):
         raise error.AccessError(description="Token invalid")
     
-    u_id = helper_functions.check_token(token).get('u_id')
-
     #If channel valid
     if helper_functions.check_channelid_valid(channel_id):
         raise error.InputError(description="Channel_id invalid")
@@ -121,15 +127,16 @@ def standup_send(token, channel_id, message):
         raise error.InputError(description="Message length too long")
             
     #Make a new message 
-    for user in auth.registered_users:
-        if user['u_id'] == u_id:
-            handle_str = user['handle']
-            break 
+    handle_str = auth_user['user']['handle']
 
     string = str(handle_str) + ": " + str(message)
 
-    #Append message to CHANNELSMSG
-    CHANNELSMSG[channel_id].append(string)
+    #Append message to CHANNELSMSG through its job so the message is journaled,
+    #the standup may have ended since it was checked
+    job_ids = [standup['job_id'] for standup in STANDUPS if standup['channel_id'] == channel_id]
+    if not job_ids or not scheduler.extend(job_ids[0], string):
+        raise error.InputError(description="Startup is not currently active")
     return {}
 
-    
\ No newline at end of file
+
+scheduler.register('standup_send', helper_send_message, helper_restore_standup)
@@ -3,6 +3,7 @@ import auth
 import channels 
 import channel 
 import standup
+import scheduler
 import user
 import error 
 import time
@@ -266,4 +267,49 @@ def test_active_output3():
     standup.standup_start(user['token'], channel["channel_id"], 3)
     assert standup.standup_active(user['token'], channel['channel_id']).get('is_active') == True
     time.sleep(4)
-    assert standup.standup_active(user['token'], channel['channel_id']).get('is_active') == False
\ No newline at end of file
+    assert standup.standup_active(user['token'], channel['channel_id']).get('is_active') == False
+
+def test_standup_survives_restart(monkeypatch, tmp_path):
+    """
+    Tests that a standup and its messages are reloaded from the scheduler journal.
+    """
+    monkeypatch.setattr(scheduler, 'JOURNAL_PATH', str(tmp_path / 'scheduled.jsonl'))
+    clear()
+    user1 = auth.auth_register("email1@email.com", "password", "Bilbo", "Baggins")
+    channel_dict = channels.channels_create(user1['token'], "test_channel", True)
+    standup.standup_start(user1['token'], channel_dict['channel_id'], 2)
+    standup.standup_send(user1['token'], channel_dict['channel_id'], "message1")
+
+    # Forget the standup, as if the server had restarted
+    with scheduler.QUEUE_LOCK:
+        scheduler.JOBS.clear()
+        scheduler.QUEUE.clear()
+    standup.STANDUPS = []
+    standup.CHANNELSMSG = {}
+
+    assert scheduler.load() == 1
+    assert standup.standup_active(user1['token'], channel_dict['channel_id'])['is_active']
+    standup.standup_send(user1['token'], channel_dict['channel_id'], "message2")
+
+    assert scheduler.wait_until_idle(5)
+    message_dict = channel.channel_messages(user1['token'], channel_dict['channel_id'], 0)
+    assert message_dict['messages'][0]['message'] == "bilbobaggins: message1\nbilbobaggins: message2"
+    assert not standup.standup_active(user1['token'], channel_dict['channel_id'])['is_active']
+    clear()
+
+def test_standup_send_after_job_ran():
+    """
+    Tests that a message sent just as the standup finishes is refused rather than lost.
+    """
+    clear()
+    user1 = auth.auth_register("email1@email.com", "password", "Bilbo", "Baggins")
+    channel_dict = channels.channels_create(user1['token'], "test_channel", True)
+    standup.standup_start(user1['token'], channel_dict['channel_id'], 60)
+
+    # The job finished but the standup hasn't been removed yet
+    with scheduler.QUEUE_LOCK:
+        scheduler.JOBS.clear()
+
+    with pytest.raises(error.InputError):
+        standup.standup_send(user1['token'], channel_dict['channel_id'], "message1")
+    clear()
@@ -4,6 +4,7 @@ Imported files for user.
 import re
 import error
 import auth
+import channels
 from PIL import Image
 import urllib
 from flask import url_for
@@ -15,7 +16,8 @@ def user_profile(token, u_id):
     Returns profile details for a valid user.
     '''
     # Test for an invalid token 
-    if helper_functions.check_token(token).get('token_status'):
+    auth_user = helper_functions.auth_context(token)
+    if auth_user.get('token_status'):
         raise error.AccessError(description="Token invalid")
     
     # Testing for an invalid u_id
@@ -23,29 +25,18 @@ def user_profile(token, u_id):
         raise error.InputError("You have entered an invalid user id")
     
     # Getting all the user details 
-    for users in auth.registered_users:
-        if users['u_id'] == u_id and users.get('profile_img_url') == None:
-            user_detail = {
-                'user' : {
-                    'u_id': users.get('u_id'),
-                    'email': users.get('email'),
-                    'name_first': users.get('first_name'),
-                    'name_last': users.get('last_name'),
-                    'handle_str': users.get('handle'),
-                }
-            }
-        if users['u_id'] == u_id and users.get('profile_img_url') != None:
-            user_detail = {
-                'user' : {
-                    'u_id': users.get('u_id'),
-                    'email': users.get('email'),
-                    'name_first': users.get('first_name'),
-                    'name_last': users.get('last_name'),
-                    'handle_str': users.get('handle'),
-                    'profile_img_url': users.get('profile_img_url')
-                }
-            }
-            break
+    users = auth.registered_users[u_id]
+    user_detail = {
+        'user' : {
+            'u_id': users.get('u_id'),
+            'email': users.get('email'),
+            'name_first': users.get('first_name'),
+            'name_last': users.get('last_name'),
+            'handle_str': users.get('handle'),
+        }
+    }
+    if users.get('profile_img_url') != None:
+        user_detail['user']['profile_img_url'] = users.get('profile_img_url')
 
     return user_detail
 
@@ -55,11 +46,10 @@ def user_profile_setname(token, name_first, name_last):
     '''
     
     # Checking is the token exist then getting their u_id
-    if helper_functions.check_token(token).get('token_status'):
+    auth_user = helper_functions.auth_context(token)
+    if auth_user.get('token_status'):
         raise error.AccessError(description="Token invalid")
     
-    user_id = helper_functions.check_token(token).get('u_id')
-
     #If first_name is not 1 < first_name < 50
     if (len(name_first) < 1) or (len(name_first) > 50):
         raise error.InputError("First name invalid, needs to be between 1 and 50 characters")
@@ -71,12 +61,9 @@ def user_profile_setname(token, name_first, name_last):
     # new value for keys to update name
     new_name = {'first_name': name_first, 'last_name': name_last}
 
-    # loops through users in list
-    for users in auth.registered_users:
-        if users['u_id'] == user_id:
-            # gets rid of existing value and replaces it with new value
-            users.update(new_name)
-            break
+    # gets rid of existing value and replaces it with new value
+    auth_user['user'].update(new_name)
+    channels.invalidate_user_details(auth_user.get('u_id'))
 
     return {}
 
@@ -88,35 +75,23 @@ def user_profile_setemail(token, email):
     regex = r'^[a-z0-9]+[\._]?[a-z0-9]+[@]\w+[.]\w{2,3}$'
 
     # Checking is the token exist then getting their u_id
-    if helper_functions.check_token(token).get('token_status'):
+    auth_user = helper_functions.auth_context(token)
+    if auth_user.get('token_status'):
         raise error.AccessError(description="Token invalid")
     
-    u_id = helper_functions.check_token(token).get('u_id')
-
-    # Testing for an invalid email
-    invalid_email = False
-    for user in auth.registered_tokens:
-        if user.get("email") == email:
-            invalid_email = True 
-            break
-        
-    if invalid_email:
-        raise error.InputError("You have entered an invalid email")
-
     #If email is invalid
     if not re.search(regex, str(email)):
         raise error.InputError(description="Email Invalid")
     
     # Testing for email that is already being used
-    for data in auth.registered_users:
-        if data.get('email') == email:
-            raise error.InputError("Email is already being used")
+    if email in auth.registered_emails:
+        raise error.InputError("Email is already being used")
             
-    # Updating the user's email
-    for users in auth.registered_users:
-        if users.get('u_id') == u_id:
-            users['email'] = email
-            break
+    # Updating the user's email and the email index
+    users = auth_user['user']
+    del auth.registered_emails[users['email']]
+    users['email'] = email
+    auth.registered_emails[email] = users
         
     return {}
 
@@ -125,25 +100,21 @@ def user_profile_sethandle(token, handle_str):
     Update the authorised user's handle.
     '''
     #Check if token valid and get u_id
-    if helper_functions.check_token(token).get('token_status'):
+    auth_user = helper_functions.auth_context(token)
+    if auth_user.get('token_status'):
         raise error.AccessError(description="Token invalid")
     
-    u_id = helper_functions.check_token(token).get('u_id')
-    
     #If handle_str valid
     if len(handle_str) < 3 or len(handle_str) > 20:
         raise error.InputError(description="Handle_str invalid")
 
-    #If handle_str already being used
-    for item in auth.registered_users:
-        if item.get("handle") == handle_str:
-            raise error.InputError(description="Handle_str being used")
+    #Reserve handle_str, raises if it is already being used
+    item = auth_user['user']
+    auth.reserve_handle(handle_str, item)
     
-    #Update handle_str
-    for item in auth.registered_users:
-        if item.get("u_id") == u_id:
-            item["handle"] = handle_str
-            break
+    #Update handle_str and release the old one
+    auth.release_handle(item["handle"])
+    item["handle"] = handle_str
 
     return {}
 
@@ -152,10 +123,11 @@ def user_profile_uploadphoto(token, img_url, x_start, y_start, x_end, y_end):
     Update the authorised user's profile.
     '''
     # Checking is the token exist then getting their u_id
-    if helper_functions.check_token(token).get('token_status'):
+    auth_user = helper_functions.auth_context(token)
+    if auth_user.get('token_status'):
         raise error.AccessError(description="Token invalid")
     
-    u_id = helper_functions.check_token(token).get('u_id')
+    u_id = auth_user.get('u_id')
     
     try:
         urllib.request.urlretrieve(img_url, f"src/static/{u_id}.jpg")
@@ -178,9 +150,7 @@ def user_profile_uploadphoto(token, img_url, x_start, y_start, x_end, y_end):
 
     profile_img_url = url_for('static', filename=f'{u_id}.jpg', _external=True)
 
-    for users in auth.registered_users:
-        if users['u_id'] == u_id:
-            users['profile_img_url'] = profile_img_url
-            break
+    auth_user['user']['profile_img_url'] = profile_img_url
+    channels.invalidate_user_details(u_id)
 
     return {}
@@ -165,6 +165,29 @@ def test_already_used_email():
     with pytest.raises(error.InputError):
         user.user_profile_setemail(user_1.get('token'), 'test_email2@gmail.com')
 
+def test_email_used_by_other_user():
+    '''
+    Testing when updated email belongs to another user.
+    '''
+    clear()
+    auth.auth_register("test_email3@gmail.com", "password", "User_1", "User_last_1")
+    user_2 = auth.auth_register("test_email4@gmail.com", "password", "User_2", "User_last_2")
+    with pytest.raises(error.InputError):
+        user.user_profile_setemail(user_2.get('token'), 'test_email3@gmail.com')
+
+def test_setemail_updates_login():
+    '''
+    Testing that the user logs in with the new email and not the old one.
+    '''
+    clear()
+    user_1 = auth.auth_register("test_email5@gmail.com", "password", "User_1", "User_last_1")
+    user.user_profile_setemail(user_1.get('token'), 'test_email6@gmail.com')
+    auth.auth_logout(user_1.get('token'))
+
+    with pytest.raises(error.InputError):
+        auth.auth_login("test_email5@gmail.com", "password")
+    assert auth.auth_login("test_email6@gmail.com", "password").get('u_id') == user_1.get('u_id')
+
 def test_invalid_token():
     '''
     Testing when token is invalid.
@@ -405,6 +428,19 @@ def test_handle_already_being_used():
     with pytest.raises(error.InputError):
         user.user_profile_sethandle(user_token2, 'NewHandle')
 
+def test_old_handle_released():
+    '''
+    Testing that a handle can be reused once its owner changes handle.
+    '''
+    clear()
+    user1 = auth.auth_register("user@gmail.com", "password", "Firstname", "Lastname")
+    user.user_profile_sethandle(user1.get("token"), 'NewHandle')
+    user2 = auth.auth_register("user2@gmail.com", "password", "Other", "Person")
+    user.user_profile_sethandle(user2.get("token"), 'firstnamelastname')
+
+    details = user.user_profile(user2.get("token"), user2.get("u_id"))
+    assert details.get('user').get("handle_str") == 'firstnamelastname'
+
 def test_handle_str_working():
     '''
     Testing if user_profile_sethandle works.